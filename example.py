@@ -18,16 +18,10 @@ def goobye_world(request: Request, response: Response):
 
 
 router = Router()
-router.get(r'/(?P<what>[^\/]+)', hello_world, goobye_world)
-
-
-def handle(request: Request, response: Response):
-    route = router.find_route(request.method, request.path)
-    return route.handle(request, response)
-
+router.get('/<what>', hello_world, goobye_world)
 
 if __name__ == "__main__":
-    app = Application(handle)
+    app = Application(router.handle)
     app.use_middleware(handle_errors)
     app.use_middleware(log_request)
     app.use_middleware(log_response)
@@ -0,0 +1,132 @@
+# Standard libs imports
+import random
+import tracemalloc
+from typing import Any, Dict, List, Tuple, Optional
+from threading import Lock
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.metrics import UNMATCHED_ROUTE
+from py_sugo.response import Response
+from py_sugo.middleware import NextFunction
+
+TRACE_FILTERS: Tuple[tracemalloc.Filter, ...] = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+class RouteAllocations:
+    __slots__ = ('samples', 'net_bytes', 'max_net_bytes', 'max_peak_bytes', 'sites')
+
+    def __init__(self: 'RouteAllocations'):
+        self.samples = 0
+        self.net_bytes = 0
+        self.max_net_bytes = 0
+        self.max_peak_bytes = 0
+        # Allocation site -> (net bytes, net blocks) summed over the samples
+        self.sites: Dict[str, List[int]] = dict()
+
+
+# Samples requests one at a time, tracemalloc counters are process wide
+class AllocationTracker:
+    sample_rate: float
+    top_n: int
+    frames: int
+    track_sites: bool
+
+    def __init__(self: 'AllocationTracker', sample_rate: float = 0.01, top_n: int = 10, frames: int = 1, track_sites: bool = True):
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.frames = frames
+        self.track_sites = track_sites
+        self._routes: Dict[str, RouteAllocations] = dict()
+        self._routes_lock = Lock()
+        self._sampling = Lock()
+        self._enabled = False
+        # Tracing started by someone else, PYTHONTRACEMALLOC for instance, is left running on stop
+        self._started_tracing = False
+
+    def start(self: 'AllocationTracker'):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._enabled = True
+
+    def stop(self: 'AllocationTracker'):
+        self._enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __call__(self: 'AllocationTracker', request: Request, response: Response, next_layer: NextFunction):
+        if not self._enabled or not tracemalloc.is_tracing() or random.random() >= self.sample_rate or not self._sampling.acquire(blocking=False):
+            return next_layer()
+        try:
+            before = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS) if self.track_sites else None
+            tracemalloc.reset_peak()
+            current_before = tracemalloc.get_traced_memory()[0]
+            try:
+                return next_layer()
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS) if before is not None else None
+                self.record(request.route or UNMATCHED_ROUTE, current - current_before, peak - current_before, before, after)
+        finally:
+            self._sampling.release()
+
+    def record(self: 'AllocationTracker',
+               route: str,
+               net_bytes: int,
+               peak_bytes: int,
+               before: Optional[tracemalloc.Snapshot] = None,
+               after: Optional[tracemalloc.Snapshot] = None):
+        differences = after.compare_to(before, 'lineno') if after is not None and before is not None else []
+        with self._routes_lock:
+            allocations = self._routes.get(route)
+            if allocations is None:
+                allocations = self._routes[route] = RouteAllocations()
+            allocations.samples += 1
+            allocations.net_bytes += net_bytes
+            allocations.max_net_bytes = max(allocations.max_net_bytes, net_bytes)
+            allocations.max_peak_bytes = max(allocations.max_peak_bytes, peak_bytes)
+            for difference in differences:
+                if difference.size_diff <= 0:
+                    continue
+                frame = difference.traceback[0]
+                site = allocations.sites.setdefault('%s:%d' % (frame.filename, frame.lineno), [0, 0])
+                site[0] += difference.size_diff
+                site[1] += difference.count_diff
+            # Keeps some slack over top_n so sites that grow slowly across samples still get counted
+            if len(allocations.sites) > self.top_n * 4:
+                kept = sorted(allocations.sites.items(), key=lambda item: item[1][0], reverse=True)[:self.top_n * 2]
+                allocations.sites = dict(kept)
+
+    def report(self: 'AllocationTracker') -> Dict[str, Any]:
+        with self._routes_lock:
+            return {
+                route: {
+                    "samples": allocations.samples,
+                    "mean_net_bytes": allocations.net_bytes // allocations.samples,
+                    "max_net_bytes": allocations.max_net_bytes,
+                    "max_peak_bytes": allocations.max_peak_bytes,
+                    "top_sites": [{
+                        "site": site,
+                        "size": size,
+                        "count": count
+                    } for site, (size, count) in sorted(allocations.sites.items(), key=lambda item: item[1][0], reverse=True)[:self.top_n]],
+                }
+                for route, allocations in self._routes.items()
+            }
+
+    def reset(self: 'AllocationTracker'):
+        with self._routes_lock:
+            self._routes.clear()
+
+    def handle(self: 'AllocationTracker', request: Request, response: Response):
+        return response.json({"tracing": tracemalloc.is_tracing(), "routes": self.report()})
+
+    def router(self: 'AllocationTracker', path: str = '/allocations') -> Router:
+        return Router().get(path, self.handle)
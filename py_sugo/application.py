@@ -1,64 +1,144 @@
 # Standard libs imports
-from typing import List
+import time
+from typing import Dict, List, Union, Optional
 from threading import Thread
-from wsgiref.simple_server import WSGIServer, make_server
+from wsgiref.simple_server import make_server
 
 # First party libs imports
-from py_sugo.server import PySuGoServer
-from py_sugo.request import Request
+from py_sugo.server import PySuGoServer, PreforkServer
+from py_sugo.core import CONTENT_TYPE
+from py_sugo.request import SPOOL_THRESHOLD, Request
 from py_sugo.response import Response
-from py_sugo.middleware import Middleware, RequestHandler
+from py_sugo.watchdog import Watchdog
+from py_sugo.lifecycle import Hook, Lifecycle
+from py_sugo.profiling import Profiler
+from py_sugo.middleware import Middleware, RequestHandler, MiddlewareChain
+
+
+REQUEST_ENTITY_TOO_LARGE_BODY: bytes = b'{"message": "Request body too large", "status_code": 413}'
 
 
 class Application:
     middlewares: List[Middleware]
-    current_layer: int
-    server: WSGIServer
+    chain: MiddlewareChain
+    server: Union[PySuGoServer, PreforkServer]
     server_thread: Thread
+    lifecycle: Lifecycle
+    max_body_size: Optional[int]
+    spool_threshold: int
+    profiler: Optional[Profiler] = None
 
-    def __init__(self: 'Application', request_handler: RequestHandler):
+    def __init__(self: 'Application',
+                 request_handler: RequestHandler,
+                 drain_timeout: float = 30.0,
+                 max_body_size: Optional[int] = None,
+                 spool_threshold: int = SPOOL_THRESHOLD):
         self.middlewares = list()
-        self.current_layer = 0
         self.request_handler = request_handler
+        self.chain = MiddlewareChain(self.middlewares, request_handler)
+        self.lifecycle = Lifecycle(drain_timeout)
+        self.max_body_size = max_body_size
+        self.spool_threshold = spool_threshold
 
     def __call__(self: 'Application', environ, start_response):
-        self.current_layer: int = 0
-        request = Request(environ)
-        response = Response(start_response, request)
-
-        def next_layer():
-            if self.current_layer >= len(self.middlewares):
-                return self.request_handler(request, response)
-            layer = self.middlewares[self.current_layer]
-            self.current_layer += 1
-            return layer(request, response, next_layer)
-
-        next_layer()
-        yield response.body
-        return response.body
+        self.lifecycle.request_started()
+        try:
+            request = Request(environ, self.max_body_size, self.spool_threshold)
+            response = Response(start_response, request)
+            if request.exceeds_max_body_size():
+                # Rejected before any middleware runs and before a single byte of the body is read
+                response.status(413).headers.add_header(CONTENT_TYPE, 'application/json')
+                response.send(REQUEST_ENTITY_TOO_LARGE_BODY)
+            else:
+                self.chain(request, response)
+        finally:
+            self.lifecycle.request_finished()
+        return response.commit(environ)
 
     def use_middleware(self: 'Application', middleware: Middleware):
         self.middlewares.append(middleware)
+        self.chain = self._compile_chain()
+
+    def use_watchdog(self: 'Application', watchdog: Watchdog):
+        # First layer, so the time spent in every other middleware counts towards the request's age
+        self.middlewares.insert(0, watchdog)
+        self.chain = self._compile_chain()
+        self.on_startup(watchdog.start)
+        self.on_shutdown(watchdog.stop)
 
-    def listen(self, host='localhost', port=5000, parallel=False):
-        self.server = make_server(host, port, self, server_class=PySuGoServer)
+    def use_profiler(self: 'Application', profiler: Optional[Profiler]):
+        self.profiler = profiler
+        self.chain = self._compile_chain()
+
+    def _compile_chain(self: 'Application') -> MiddlewareChain:
+        if self.profiler is None:
+            return MiddlewareChain(self.middlewares, self.request_handler)
+        return self.profiler.instrument(self.middlewares, self.request_handler, profile=True)
+
+    def listen(self,
+               host='localhost',
+               port=5000,
+               parallel=False,
+               workers=0,
+               backlog=64,
+               processes=0,
+               keep_alive=False,
+               keep_alive_timeout=5.0,
+               max_keep_alive_requests=100):
+        server = make_server(host, port, self, server_class=PySuGoServer)
+        if workers > 0:
+            server.use_worker_pool(workers, backlog)
+        if keep_alive:
+            server.use_keep_alive(keep_alive_timeout, max_keep_alive_requests, self.max_body_size, self.spool_threshold)
+        if processes > 0:
+            # Startup hooks run in every child after the fork, the threads they start must live where requests are served
+            self.server = PreforkServer(server, processes, self.lifecycle.run_startup_hooks, self.lifecycle.run_shutdown_hooks)
+            self.lifecycle.clear_stop_request()
+            self.server.start()
+        else:
+            self.server = server
+            self.lifecycle.run_startup_hooks()
         self.server_thread = Thread(target=self.server.serve_forever)
         self.server_thread.start()
         if not parallel:
             self.wait_for_interrupt()
 
+    def on_startup(self: 'Application', hook: Hook) -> Hook:
+        return self.lifecycle.on_startup(hook)
+
+    def on_shutdown(self: 'Application', hook: Hook) -> Hook:
+        return self.lifecycle.on_shutdown(hook)
+
+    def stats(self) -> Dict[str, int]:
+        return self.server.stats()
+
     def is_listening(self) -> bool:
         return self.server_thread.is_alive()
 
     def wait_for_interrupt(self):
+        installed = self.lifecycle.install_signal_handlers()
         try:
-            while self.is_listening():
-                pass
+            self.lifecycle.wait_for_stop(self.is_listening)
         except (KeyboardInterrupt, SystemExit):
-            self.close()
+            pass
+        finally:
+            if installed:
+                self.lifecycle.restore_signal_handlers()
+        self.close()
 
-    def close(self):
+    def close(self, drain_timeout: Optional[float] = None) -> bool:
+        # Stop accepting first, then give the requests already accepted a chance to finish before tearing down
+        drain_timeout = self.lifecycle.drain_timeout if drain_timeout is None else drain_timeout
+        deadline = time.monotonic() + drain_timeout
         self.server.shutdown()
         while self.server_thread.is_alive():
             self.server_thread.join()
+        drained = self.lifecycle.drain(self._pending_requests, max(deadline - time.monotonic(), 0))
+        self.server.server_close(max(deadline - time.monotonic(), 0))
         self.server_thread = None
+        if not isinstance(self.server, PreforkServer):
+            self.lifecycle.run_shutdown_hooks()
+        return drained
+
+    def _pending_requests(self) -> int:
+        return self.server.stats().get('queue_depth', 0)
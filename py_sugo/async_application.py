@@ -0,0 +1,281 @@
+# Standard libs imports
+import io
+import sys
+import queue
+import signal
+import asyncio
+import inspect
+import functools
+from http import HTTPStatus
+from typing import Any, Dict, List, Tuple, Callable, Optional, Awaitable, AsyncIterator
+from threading import Event, Thread, current_thread, main_thread
+from concurrent.futures import ThreadPoolExecutor
+
+# First party libs imports
+from py_sugo.core import CONTENT_LENGTH
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import Middleware, RequestHandler
+from py_sugo.connections import (MAX_BODY_SIZE, CONTINUE_RESPONSE, BAD_REQUEST_RESPONSE, REQUEST_ENTITY_TOO_LARGE_RESPONSE,
+                                 RequestTooLarge, build_environ, should_keep_alive, status_allows_body)
+
+AsyncNextFunction = Callable[[], Awaitable[Any]]
+WsgiHeaders = List[Tuple[str, str]]
+
+INTERNAL_SERVER_ERROR: str = '%d %s' % (HTTPStatus.INTERNAL_SERVER_ERROR.value, HTTPStatus.INTERNAL_SERVER_ERROR.phrase)
+
+
+def is_async(function: Callable) -> bool:
+    return inspect.iscoroutinefunction(function) or inspect.iscoroutinefunction(getattr(function, '__call__', None))
+
+
+# Runs the synchronous layers of a request on one executor thread: while a sync middleware waits in next_layer(),
+# the sync layers below it are handed back to its thread, so a request never needs a second executor thread
+class SyncLayerRunner:
+    loop: asyncio.AbstractEventLoop
+    executor: ThreadPoolExecutor
+
+    def __init__(self: 'SyncLayerRunner', loop: asyncio.AbstractEventLoop, executor: ThreadPoolExecutor):
+        self.loop = loop
+        self.executor = executor
+        self._tasks: queue.SimpleQueue = queue.SimpleQueue()
+        self._waiting = 0
+
+    async def call(self: 'SyncLayerRunner', function: Callable, *args) -> Any:
+        if self._waiting == 0:
+            return await self.loop.run_in_executor(self.executor, function, *args)
+        future = self.loop.create_future()
+        self._tasks.put((function, args, future))
+        return await future
+
+    def wait_for(self: 'SyncLayerRunner', coroutine: Awaitable) -> Any:
+        self._waiting += 1
+        try:
+            done = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+            done.add_done_callback(lambda _: self._tasks.put(None))
+            while not done.done():
+                task = self._tasks.get()
+                if task is not None:
+                    self._run_task(*task)
+            return done.result()
+        finally:
+            self._waiting -= 1
+
+    def _run_task(self: 'SyncLayerRunner', function: Callable, args: Tuple, future: asyncio.Future):
+        try:
+            result = function(*args)
+        except Exception as error:
+            self.loop.call_soon_threadsafe(self._settle, future, None, error)
+        else:
+            self.loop.call_soon_threadsafe(self._settle, future, result, None)
+
+    @staticmethod
+    def _settle(future: asyncio.Future, result: Any, error: Optional[Exception]):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+# Asyncio counterpart of Application, handlers and middlewares may be async functions awaiting next_layer()
+class AsyncApplication:
+    middlewares: List[Middleware]
+    executor: ThreadPoolExecutor
+    loop: asyncio.AbstractEventLoop
+    server: Optional[asyncio.AbstractServer]
+    server_thread: Thread
+    max_body_size: Optional[int]
+
+    def __init__(self: 'AsyncApplication',
+                 request_handler: RequestHandler,
+                 executor_workers: Optional[int] = None,
+                 max_body_size: Optional[int] = MAX_BODY_SIZE):
+        self.middlewares = list()
+        self.max_body_size = max_body_size
+        self.request_handler = request_handler
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='py-sugo-executor')
+        self.server = None
+        self._started = Event()
+        self._serve_task: Optional[asyncio.Task] = None
+
+    def use_middleware(self: 'AsyncApplication', middleware: Middleware):
+        self.middlewares.append(middleware)
+
+    async def handle(self: 'AsyncApplication', environ: Dict) -> Tuple[str, WsgiHeaders, Any]:
+        started_response: Dict[str, Any] = {"status": INTERNAL_SERVER_ERROR, "headers": [(CONTENT_LENGTH, '0')]}
+
+        def start_response(status: str, headers: WsgiHeaders, exc_info=None):
+            started_response['status'] = status
+            started_response['headers'] = headers
+
+        request = Request(environ)
+        response = Response(start_response, request)
+        runner = SyncLayerRunner(asyncio.get_running_loop(), self.executor)
+        await self._call_layer(0, request, response, runner)
+        body = response.commit(environ)
+        return started_response['status'], started_response['headers'], body
+
+    async def _call_layer(self: 'AsyncApplication', index: int, request: Request, response: Response, runner: SyncLayerRunner) -> Any:
+        if index >= len(self.middlewares):
+            if is_async(self.request_handler):
+                return await self.request_handler(request, response)
+            return await runner.call(self.request_handler, request, response)
+
+        layer = self.middlewares[index]
+        next_layer: AsyncNextFunction = functools.partial(self._call_layer, index + 1, request, response, runner)
+        if is_async(layer):
+            return await layer(request, response, next_layer)
+        return await runner.call(layer, request, response, lambda: runner.wait_for(next_layer()))
+
+    async def serve(self: 'AsyncApplication', host='localhost', port=5000):
+        self.server = await asyncio.start_server(self._serve_connection, host, port, reuse_address=True)
+        self._started.set()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def listen(self: 'AsyncApplication', host='localhost', port=5000, parallel=False):
+        self._started.clear()
+        self.loop = asyncio.new_event_loop()
+        self.server_thread = Thread(target=self._run_loop, args=(host, port))
+        self.server_thread.start()
+        self._started.wait()
+        if not parallel:
+            if current_thread() is main_thread():
+                signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            self.wait_for_interrupt()
+
+    def is_listening(self: 'AsyncApplication') -> bool:
+        return self.server_thread.is_alive()
+
+    def wait_for_interrupt(self: 'AsyncApplication'):
+        try:
+            while self.is_listening():
+                self.server_thread.join(0.5)
+        except (KeyboardInterrupt, SystemExit):
+            self.close()
+
+    def close(self: 'AsyncApplication'):
+        if self._serve_task is not None:
+            self.loop.call_soon_threadsafe(self._serve_task.cancel)
+        self.server_thread.join()
+        self.executor.shutdown(wait=True)
+
+    def _run_loop(self: 'AsyncApplication', host: str, port: int):
+        asyncio.set_event_loop(self.loop)
+        self._serve_task = self.loop.create_task(self.serve(host, port))
+        try:
+            self.loop.run_until_complete(self._serve_task)
+        except asyncio.CancelledError:
+            pass
+        except BaseException:
+            self._started.set()
+            raise
+        finally:
+            self.loop.close()
+
+    async def _serve_connection(self: 'AsyncApplication', reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        server_name, server_port = writer.get_extra_info('sockname')[:2]
+        peer = writer.get_extra_info('peername') or ('', 0)
+        base_environ = {"SERVER_NAME": server_name, "SERVER_PORT": str(server_port), "SCRIPT_NAME": ''}
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                    environ = build_environ(head, base_environ, peer)
+                    body = await self._read_body(reader, writer, environ)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                except RequestTooLarge:
+                    writer.write(REQUEST_ENTITY_TOO_LARGE_RESPONSE)
+                    await writer.drain()
+                    return
+                except ValueError:
+                    writer.write(BAD_REQUEST_RESPONSE)
+                    await writer.drain()
+                    return
+                environ['wsgi.input'] = io.BytesIO(body)
+                keep_alive = should_keep_alive(environ)
+                try:
+                    status, headers, response_body = await self.handle(environ)
+                except Exception:
+                    status, headers, response_body, keep_alive = INTERNAL_SERVER_ERROR, [(CONTENT_LENGTH, '0')], [], False
+                send_body = environ['REQUEST_METHOD'] != 'HEAD' and status_allows_body(int(status[:3]))
+                has_length = any(name.lower() == 'content-length' for name, _ in headers)
+                chunked = send_body and not has_length and environ['SERVER_PROTOCOL'] == 'HTTP/1.1'
+                keep_alive = keep_alive and (chunked or has_length or not send_body)
+                writer.write(self._serialize_head(status, headers, keep_alive, chunked))
+                try:
+                    if send_body:
+                        async for chunk in self._body_chunks(response_body):
+                            writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                            await writer.drain()
+                        if chunked:
+                            writer.write(b'0\r\n\r\n')
+                finally:
+                    if hasattr(response_body, 'close'):
+                        response_body.close()
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    async def _read_body(self: 'AsyncApplication', reader: asyncio.StreamReader, writer: asyncio.StreamWriter, environ: Dict) -> bytes:
+        chunked = environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked'
+        content_length = 0 if chunked else int(environ.get('CONTENT_LENGTH') or 0)
+        if content_length < 0:
+            raise ValueError('Negative Content-Length')
+        if self.max_body_size is not None and content_length > self.max_body_size:
+            raise RequestTooLarge()
+        if (chunked or content_length > 0) and environ.get('HTTP_EXPECT', '').lower() == '100-continue':
+            writer.write(CONTINUE_RESPONSE)
+        if not chunked:
+            return await reader.readexactly(content_length) if content_length > 0 else b''
+        body = bytearray()
+        while True:
+            size = int((await reader.readuntil(b'\r\n'))[:-2].split(b';', 1)[0], 16)
+            if size == 0:
+                break
+            if self.max_body_size is not None and len(body) + size > self.max_body_size:
+                raise RequestTooLarge()
+            body += await reader.readexactly(size)
+            if await reader.readexactly(2) != b'\r\n':
+                raise ValueError('Invalid chunk terminator')
+        # Trailer fields, if any, end with an empty line
+        while await reader.readuntil(b'\r\n') != b'\r\n':
+            pass
+        environ['CONTENT_LENGTH'] = str(len(body))
+        del environ['HTTP_TRANSFER_ENCODING']
+        return bytes(body)
+
+    async def _body_chunks(self: 'AsyncApplication', body: Any) -> AsyncIterator[bytes]:
+        if hasattr(body, '__aiter__'):
+            async for chunk in body:
+                if chunk:
+                    yield chunk
+        elif isinstance(body, (list, tuple)):
+            for chunk in body:
+                if chunk:
+                    yield chunk
+        else:
+            # Generators and files may block, they are advanced on the executor to keep the event loop free
+            loop = asyncio.get_running_loop()
+            chunks = iter(body)
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            while chunk is not None:
+                if chunk:
+                    yield chunk
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+
+    @staticmethod
+    def _serialize_head(status: str, headers: WsgiHeaders, keep_alive: bool, chunked: bool) -> bytes:
+        lines = ['HTTP/1.1 %s' % status]
+        lines.extend('%s: %s' % (name, value) for name, value in headers)
+        if chunked:
+            lines.append('Transfer-Encoding: chunked')
+        lines.append('Connection: %s' % ('keep-alive' if keep_alive else 'close'))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1')
@@ -0,0 +1,159 @@
+# Standard libs imports
+import time
+from typing import Set, Dict, Tuple, Iterable, Optional
+from threading import Lock
+from collections import OrderedDict
+
+# First party libs imports
+from py_sugo.core import GET, HEAD
+from py_sugo.headers import HeaderMap, WsgiHeaders
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import NextFunction
+
+CacheKey = Tuple[str, str, Tuple, Tuple]
+
+CACHEABLE_STATUS_CODES: Set[int] = {200, 203, 204, 300, 301, 404, 405, 410}
+UNSAFE_METHODS: Set[str] = {'POST', 'PUT', 'PATCH', 'DELETE'}
+# Requests carrying credentials get answers meant for one user only, they never go through the cache
+PRIVATE_REQUEST_HEADERS: Tuple[str, ...] = ('Authorization', 'Cookie')
+
+
+class CacheEntry:
+    __slots__ = ('status_code', 'headers', 'body', 'size', 'stored_at', 'expires_at')
+
+    def __init__(self: 'CacheEntry', status_code: int, headers: WsgiHeaders, body: bytes, ttl: float):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.size = len(body) + sum(len(name) + len(value) for name, value in headers)
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+
+
+# Route TTLs are keyed by url pattern, a TTL of 0 turns caching off for the route
+class ResponseCacheMiddleware:
+    ttl: float
+    max_entries: int
+    max_bytes: int
+    vary: Tuple[str, ...]
+    route_ttls: Dict[str, float]
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self: 'ResponseCacheMiddleware',
+                 ttl: float = 5.0,
+                 max_entries: int = 1024,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 vary: Iterable[str] = ('Accept-Encoding', ),
+                 route_ttls: Optional[Dict[str, float]] = None,
+                 invalidate_on_write: bool = True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.vary = tuple(vary)
+        self.route_ttls = dict(route_ttls or {})
+        self.invalidate_on_write = invalidate_on_write
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[CacheKey, CacheEntry]' = OrderedDict()
+        self._paths: Dict[str, Set[CacheKey]] = dict()
+        self._size = 0
+        self._lock = Lock()
+
+    def __call__(self: 'ResponseCacheMiddleware', request: Request, response: Response, next_layer: NextFunction):
+        if request.method not in (GET, HEAD):
+            result = next_layer()
+            if self.invalidate_on_write and request.method in UNSAFE_METHODS and 200 <= response.status_code < 400:
+                self.invalidate(request.path)
+            return result
+        if any(name in request.headers for name in PRIVATE_REQUEST_HEADERS):
+            return next_layer()
+        key = self.get_key(request)
+        entry = self.get(key)
+        if entry is not None:
+            response.status(entry.status_code)
+            response.headers = HeaderMap(entry.headers)
+            response.headers['Age'] = str(int(time.monotonic() - entry.stored_at))
+            return response.send(entry.body)
+        result = next_layer()
+        ttl = self.route_ttls.get(request.route, self.ttl) if request.route is not None else self.ttl
+        if ttl > 0 and self.is_cacheable(response):
+            self.put(key, CacheEntry(response.status_code, response.headers.items(), response.body, ttl))
+        return result
+
+    def get_key(self: 'ResponseCacheMiddleware', request: Request) -> CacheKey:
+        query = tuple(sorted((name, tuple(values)) for name, values in request.query.items()))
+        return request.method, request.path, query, tuple(request.headers.get(name) for name in self.vary)
+
+    def get(self: 'ResponseCacheMiddleware', key: CacheKey) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self: 'ResponseCacheMiddleware', key: CacheKey, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._paths.setdefault(key[1], set()).add(key)
+            self._size += entry.size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def is_cacheable(self: 'ResponseCacheMiddleware', response: Response) -> bool:
+        if response.status_code not in CACHEABLE_STATUS_CODES or response.iterable is not None or response.file is not None:
+            return False
+        if 'Set-Cookie' in response.headers:
+            return False
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        return 'no-store' not in cache_control and 'private' not in cache_control
+
+    def invalidate(self: 'ResponseCacheMiddleware', path: str):
+        with self._lock:
+            for key in list(self._paths.get(path, ())):
+                self._remove(key)
+
+    def invalidate_prefix(self: 'ResponseCacheMiddleware', prefix: str):
+        with self._lock:
+            for path in [path for path in self._paths if path.startswith(prefix)]:
+                for key in list(self._paths[path]):
+                    self._remove(key)
+
+    def clear(self: 'ResponseCacheMiddleware'):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self._size = 0
+
+    def stats(self: 'ResponseCacheMiddleware') -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _remove(self: 'ResponseCacheMiddleware', key: CacheKey):
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+        keys = self._paths.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._paths[key[1]]
@@ -0,0 +1,528 @@
+# Standard libs imports
+import io
+import sys
+import time
+import queue
+import tempfile
+import selectors
+from socket import socket, socketpair
+from typing import IO, Any, Dict, List, Tuple, Callable, Iterable, Iterator, Optional
+from threading import Thread
+from urllib.parse import unquote
+
+# First party libs imports
+from py_sugo.request import SPOOL_THRESHOLD
+
+WsgiHeaders = List[Tuple[str, str]]
+WsgiApplication = Callable[[Dict, Callable], Iterable[bytes]]
+Dispatcher = Callable[..., bool]
+
+MAX_HEAD_SIZE: int = 64 * 1024
+MAX_BODY_SIZE: int = 16 * 1024 * 1024
+HEAD_TERMINATOR: bytes = b'\r\n\r\n'
+CONTINUE_RESPONSE: bytes = b'HTTP/1.1 100 Continue\r\n\r\n'
+REQUEST_ENTITY_TOO_LARGE_RESPONSE: bytes = b'HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+BAD_REQUEST_RESPONSE: bytes = b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+SERVICE_UNAVAILABLE_RESPONSE: bytes = b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+INTERNAL_SERVER_ERROR_RESPONSE: bytes = b'HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+# Where the decoding of a chunked body stands, it is resumed on every read of the connection
+CHUNK_SIZE: str = 'size'
+CHUNK_DATA: str = 'data'
+CHUNK_DATA_END: str = 'data_end'
+CHUNK_TRAILER: str = 'trailer'
+
+
+def build_environ(head: bytes, base_environ: Dict[str, Any], client_address: Tuple) -> Dict[str, Any]:
+    lines = head.decode('iso-8859-1').split('\r\n')
+    method, target, protocol = lines[0].split(' ', 2)
+    if not protocol.startswith('HTTP/'):
+        raise ValueError("Invalid request line: '%s'" % lines[0])
+    path, _, query = target.partition('?')
+    environ = base_environ.copy()
+    environ.update({
+        "REQUEST_METHOD": method,
+        "PATH_INFO": unquote(path, 'iso-8859-1'),
+        "QUERY_STRING": query,
+        "SERVER_PROTOCOL": protocol,
+        "REMOTE_ADDR": client_address[0] if client_address else '',
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": 'http',
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": FileWrapper,
+    })
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(':')
+        if not separator:
+            raise ValueError("Invalid header line: '%s'" % line)
+        key = name.strip().upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.strip()
+        environ[key] = '%s,%s' % (environ[key], value) if key in environ and key.startswith('HTTP_') else value
+    return environ
+
+
+def status_allows_body(status_code: int) -> bool:
+    # 1xx, 204 and 304 responses never carry a body, nor a Content-Length or chunked framing for one
+    return status_code >= 200 and status_code not in (204, 304)
+
+
+def should_keep_alive(environ: Dict[str, Any]) -> bool:
+    connection = environ.get('HTTP_CONNECTION', '').lower()
+    if environ.get('SERVER_PROTOCOL') == 'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+
+class RequestTooLarge(ValueError):
+    pass
+
+
+# sendfile hands the whole range to the kernel, the body never goes through Python
+class FileWrapper:
+    filelike: Any
+    block_size: int
+    length: Optional[int]
+
+    def __init__(self: 'FileWrapper', filelike: Any, block_size: int = 8192, length: Optional[int] = None):
+        self.filelike = filelike
+        self.block_size = block_size
+        self.length = length
+
+    def __iter__(self: 'FileWrapper') -> Iterator[bytes]:
+        remaining = self.length
+        while remaining is None or remaining > 0:
+            block = self.filelike.read(self.block_size if remaining is None else min(self.block_size, remaining))
+            if not block:
+                return
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
+
+    def sendfile(self: 'FileWrapper', sock: socket) -> bool:
+        if not hasattr(self.filelike, 'fileno') or not hasattr(sock, 'sendfile'):
+            return False
+        try:
+            self.filelike.fileno()
+        except (OSError, io.UnsupportedOperation):
+            return False
+        sock.sendfile(self.filelike, self.filelike.tell(), self.length)
+        return True
+
+    def close(self: 'FileWrapper'):
+        if hasattr(self.filelike, 'close'):
+            self.filelike.close()
+
+
+class Connection:
+    sock: socket
+    client_address: Tuple
+    buffer: bytearray
+    requests_served: int
+    last_activity: float
+    continue_sent: bool
+    # Request whose body is being spooled to body_file as it arrives
+    pending_environ: Optional[Dict[str, Any]]
+    body_file: Optional[IO[bytes]]
+    body_remaining: int
+    chunk_state: Optional[str]
+    body_size: int
+
+    def __init__(self: 'Connection', sock: socket, client_address: Tuple):
+        self.sock = sock
+        self.client_address = client_address
+        self.buffer = bytearray()
+        self.requests_served = 0
+        self.last_activity = time.monotonic()
+        self.continue_sent = False
+        self.pending_environ = None
+        self.body_file = None
+        self.body_remaining = 0
+        self.chunk_state = None
+        self.body_size = 0
+
+    def close(self: 'Connection'):
+        if self.body_file is not None:
+            self.body_file.close()
+            self.body_file = None
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+# Requests are only dispatched once complete, so slow or idle clients never hold a handler thread
+class ConnectionManager:
+    application: WsgiApplication
+    base_environ: Dict[str, Any]
+    idle_timeout: float
+    max_requests: int
+    max_body_size: Optional[int]
+    spool_threshold: int
+
+    def __init__(self: 'ConnectionManager',
+                 application: WsgiApplication,
+                 base_environ: Dict[str, Any],
+                 dispatch: Dispatcher,
+                 idle_timeout: float = 5.0,
+                 max_requests: int = 100,
+                 max_body_size: Optional[int] = None,
+                 spool_threshold: int = SPOOL_THRESHOLD):
+        self.application = application
+        self.base_environ = base_environ
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        self.max_body_size = max_body_size
+        self.spool_threshold = spool_threshold
+        self._dispatch = dispatch
+        self._pending: queue.SimpleQueue = queue.SimpleQueue()
+        self._connections: Dict[socket, Connection] = dict()
+        self._thread: Optional[Thread] = None
+        self._stopping = False
+        self._draining = False
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._wakeup_reader: Optional[socket] = None
+        self._wakeup_writer: Optional[socket] = None
+
+    @property
+    def open_connections(self: 'ConnectionManager') -> int:
+        return len(self._connections)
+
+    def start(self: 'ConnectionManager'):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._draining = False
+        # Created by the process that serves, pre-forked children must not share one epoll instance and wakeup pipe
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._thread = Thread(target=self._run, name='py-sugo-connections', daemon=True)
+        self._thread.start()
+
+    def stop(self: 'ConnectionManager'):
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake_up()
+        self._thread.join()
+        self._thread = None
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        self._selector = self._wakeup_reader = self._wakeup_writer = None
+
+    def drain(self: 'ConnectionManager'):
+        # Idle connections are closed and the responses in flight are sent with Connection: close, so clients stop
+        # sending new requests while the server is going away
+        self._draining = True
+        self._wake_up()
+
+    def discard(self: 'ConnectionManager', connection: Connection, environ: Dict[str, Any]):
+        # For requests that were dispatched but will never be served
+        environ['wsgi.input'].close()
+        connection.close()
+
+    def add(self: 'ConnectionManager', sock: socket, client_address: Tuple):
+        sock.setblocking(False)
+        self._pending.put(Connection(sock, client_address))
+        self._wake_up()
+
+    def resume(self: 'ConnectionManager', connection: Connection):
+        connection.sock.setblocking(False)
+        connection.last_activity = time.monotonic()
+        self._pending.put(connection)
+        self._wake_up()
+
+    def serve(self: 'ConnectionManager', connection: Connection, environ: Dict[str, Any]):
+        # Runs on a handler thread: the socket is only used in blocking mode until it is handed back with resume
+        connection.sock.setblocking(True)
+        connection.requests_served += 1
+        try:
+            keep_alive = self._write_response(connection, environ)
+        except Exception:
+            keep_alive = False
+        finally:
+            environ['wsgi.input'].close()
+        if keep_alive and not self._stopping:
+            self.resume(connection)
+        else:
+            connection.close()
+
+    def _wake_up(self: 'ConnectionManager'):
+        if self._wakeup_writer is None:
+            return
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def _run(self: 'ConnectionManager'):
+        while not self._stopping:
+            for key, _ in self._selector.select(timeout=min(self.idle_timeout, 1.0)):
+                if key.fileobj is self._wakeup_reader:
+                    self._drain_wakeups()
+                else:
+                    self._read(key.data)
+            self._register_pending()
+            self._close_idle_connections()
+        for connection in list(self._connections.values()):
+            self._forget(connection)
+            connection.close()
+        while not self._pending.empty():
+            self._pending.get().close()
+
+    def _drain_wakeups(self: 'ConnectionManager'):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _register_pending(self: 'ConnectionManager'):
+        while not self._pending.empty():
+            connection: Connection = self._pending.get()
+            # A pipelined request may already be waiting in the buffer
+            if connection.buffer and self._try_dispatch(connection, registered=False):
+                continue
+            self._connections[connection.sock] = connection
+            self._selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+    def _close_idle_connections(self: 'ConnectionManager'):
+        deadline = time.monotonic() - self.idle_timeout
+        for connection in [c for c in self._connections.values() if c.last_activity < deadline or self._is_drained(c)]:
+            self._forget(connection)
+            connection.close()
+
+    def _is_drained(self: 'ConnectionManager', connection: Connection) -> bool:
+        # A connection with part of a request already received is kept until that request is served
+        return self._draining and not connection.buffer and connection.body_file is None
+
+    def _forget(self: 'ConnectionManager', connection: Connection):
+        self._connections.pop(connection.sock, None)
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+
+    def _read(self: 'ConnectionManager', connection: Connection):
+        try:
+            data = connection.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._forget(connection)
+            connection.close()
+            return
+        connection.last_activity = time.monotonic()
+        connection.buffer += data
+        self._try_dispatch(connection, registered=True)
+
+    def _try_dispatch(self: 'ConnectionManager', connection: Connection, registered: bool) -> bool:
+        try:
+            parsed = self._parse_request(connection)
+        except RequestTooLarge:
+            self._reject(connection, REQUEST_ENTITY_TOO_LARGE_RESPONSE, registered)
+            return True
+        except ValueError:
+            self._reject(connection, BAD_REQUEST_RESPONSE, registered)
+            return True
+        if parsed is None:
+            return False
+        if registered:
+            self._forget(connection)
+        connection.continue_sent = False
+        if not self._dispatch(self.serve, connection, parsed):
+            self._reject(connection, SERVICE_UNAVAILABLE_RESPONSE, registered=False)
+        return True
+
+    def _reject(self: 'ConnectionManager', connection: Connection, response: bytes, registered: bool):
+        if registered:
+            self._forget(connection)
+        try:
+            connection.sock.setblocking(True)
+            connection.sock.sendall(response)
+        except OSError:
+            pass
+        connection.close()
+
+    def _parse_request(self: 'ConnectionManager', connection: Connection) -> Optional[Dict[str, Any]]:
+        if connection.body_file is not None:
+            return self._spool_body(connection)
+        buffer = connection.buffer
+        head_end = buffer.find(HEAD_TERMINATOR)
+        if head_end < 0:
+            if len(buffer) > MAX_HEAD_SIZE:
+                raise ValueError('Request head too large')
+            return None
+        environ = build_environ(bytes(buffer[:head_end]), self.base_environ, connection.client_address)
+        body_start = head_end + 4
+        if environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked':
+            del environ['HTTP_TRANSFER_ENCODING']
+            connection.chunk_state = CHUNK_SIZE
+            return self._start_spooling(connection, environ, body_start, 0)
+        content_length = int(environ.get('CONTENT_LENGTH') or 0)
+        if content_length < 0:
+            raise ValueError('Negative Content-Length')
+        if self.max_body_size is not None and content_length > self.max_body_size:
+            raise RequestTooLarge()
+        body_end = body_start + content_length
+        if len(buffer) < body_end:
+            if content_length > self.spool_threshold:
+                return self._start_spooling(connection, environ, body_start, content_length)
+            self._send_continue(connection, environ)
+            return None
+        body = bytes(buffer[body_start:body_end])
+        del buffer[:body_end]
+        environ['wsgi.input'] = io.BytesIO(body)
+        return environ
+
+    def _start_spooling(self: 'ConnectionManager',
+                        connection: Connection,
+                        environ: Dict[str, Any],
+                        body_start: int,
+                        content_length: int) -> Optional[Dict[str, Any]]:
+        connection.pending_environ = environ
+        connection.body_file = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+        connection.body_remaining = content_length
+        del connection.buffer[:body_start]
+        return self._spool_body(connection)
+
+    def _spool_body(self: 'ConnectionManager', connection: Connection) -> Optional[Dict[str, Any]]:
+        environ = connection.pending_environ
+        if connection.chunk_state is not None:
+            complete = self._spool_chunks(connection)
+        else:
+            complete = self._spool_bytes(connection) == 0
+        if not complete:
+            self._send_continue(connection, environ)
+            return None
+        if connection.chunk_state is not None:
+            environ['CONTENT_LENGTH'] = str(connection.body_size)
+        body_file = connection.body_file
+        connection.pending_environ = connection.body_file = connection.chunk_state = None
+        connection.body_size = 0
+        body_file.seek(0)
+        environ['wsgi.input'] = body_file
+        return environ
+
+    @staticmethod
+    def _spool_bytes(connection: Connection) -> int:
+        buffer = connection.buffer
+        size = min(len(buffer), connection.body_remaining)
+        connection.body_file.write(buffer[:size])
+        del buffer[:size]
+        connection.body_remaining -= size
+        return connection.body_remaining
+
+    def _spool_chunks(self: 'ConnectionManager', connection: Connection) -> bool:
+        # Only the bytes received since the last read are decoded, what was already decoded is in body_file
+        buffer = connection.buffer
+        while True:
+            if connection.chunk_state == CHUNK_DATA:
+                if self._spool_bytes(connection) > 0:
+                    return False
+                connection.chunk_state = CHUNK_DATA_END
+            line_end = buffer.find(b'\r\n')
+            if line_end < 0:
+                if len(buffer) > MAX_HEAD_SIZE:
+                    raise ValueError('Chunk line too large')
+                return False
+            line = bytes(buffer[:line_end])
+            del buffer[:line_end + 2]
+            if connection.chunk_state == CHUNK_DATA_END:
+                if line:
+                    raise ValueError('Chunk data too large')
+                connection.chunk_state = CHUNK_SIZE
+            elif connection.chunk_state == CHUNK_SIZE:
+                size = int(line.split(b';', 1)[0], 16)
+                if size < 0:
+                    raise ValueError('Negative chunk size')
+                connection.body_size += size
+                if self.max_body_size is not None and connection.body_size > self.max_body_size:
+                    raise RequestTooLarge()
+                connection.body_remaining = size
+                connection.chunk_state = CHUNK_DATA if size else CHUNK_TRAILER
+            elif not line:
+                return True
+
+    def _send_continue(self: 'ConnectionManager', connection: Connection, environ: Dict[str, Any]):
+        if not connection.continue_sent and environ.get('HTTP_EXPECT', '').lower() == '100-continue':
+            connection.continue_sent = True
+            try:
+                connection.sock.send(CONTINUE_RESPONSE)
+            except OSError:
+                pass
+
+    def _write_response(self: 'ConnectionManager', connection: Connection, environ: Dict[str, Any]) -> bool:
+        started: Dict[str, Any] = dict()
+        # Bodies given to the legacy write callable are sent before the ones returned by the application
+        written: List[bytes] = list()
+
+        def start_response(status: str, headers: WsgiHeaders, exc_info=None):
+            if exc_info is not None and started.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            started['status'] = status
+            started['headers'] = headers
+            return written.append
+
+        result: Any = None
+        try:
+            result = self.application(environ, start_response)
+            # The first chunk is pulled before looking at the headers, generator applications only call start_response then
+            chunks = iter(()) if isinstance(result, FileWrapper) else iter(result)
+            first_chunk = next(chunks, b'')
+            headers: WsgiHeaders = started['headers']
+        except Exception:
+            if hasattr(result, 'close'):
+                result.close()
+            connection.sock.sendall(INTERNAL_SERVER_ERROR_RESPONSE)
+            return False
+        try:
+            names = {name.lower(): value for name, value in headers}
+            send_body = environ['REQUEST_METHOD'] != 'HEAD' and status_allows_body(int(started['status'][:3]))
+            chunked = send_body and 'content-length' not in names and environ['SERVER_PROTOCOL'] == 'HTTP/1.1'
+            keep_alive = should_keep_alive(environ) and connection.requests_served < self.max_requests and not self._draining
+            keep_alive = keep_alive and names.get('connection', '').lower() != 'close'
+            keep_alive = keep_alive and (chunked or 'content-length' in names or not send_body)
+            lines = ['HTTP/1.1 %s' % started['status']]
+            lines.extend('%s: %s' % (name, value) for name, value in headers if name.lower() != 'connection')
+            if chunked:
+                lines.append('Transfer-Encoding: chunked')
+            lines.append('Connection: %s' % ('keep-alive' if keep_alive else 'close'))
+            connection.sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1'))
+            started['sent'] = True
+            is_file = isinstance(result, FileWrapper)
+            # Files with a known length go from the page cache to the socket without being copied through Python
+            if send_body and is_file and not chunked and not written and result.sendfile(connection.sock):
+                send_body = False
+            if send_body:
+                for chunk in self._body_chunks(written, first_chunk, iter(result) if is_file else chunks):
+                    connection.sock.sendall(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                if chunked:
+                    connection.sock.sendall(b'0\r\n\r\n')
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return keep_alive
+
+    @staticmethod
+    def _body_chunks(written: List[bytes], first_chunk: bytes, chunks: Iterable[bytes]) -> Iterable[bytes]:
+        for chunk in written:
+            if chunk:
+                yield chunk
+        if first_chunk:
+            yield first_chunk
+        for chunk in chunks:
+            if chunk:
+                yield chunk
@@ -0,0 +1,94 @@
+# Standard libs imports
+from typing import Any, Dict, List, Tuple, Iterable, Optional
+
+WsgiHeaders = List[Tuple[str, str]]
+
+
+def format_header_value(value: str, **params: Any) -> str:
+    parts = [value] if value is not None else []
+    for key, param in params.items():
+        key = key.replace('_', '-')
+        parts.append(key if param is None else '%s="%s"' % (key, param))
+    return '; '.join(parts)
+
+
+def format_etag(value: str, weak: bool = False) -> str:
+    if not (value.startswith('"') or value.startswith('W/"')):
+        value = '"%s"' % value
+    if weak and not value.startswith('W/'):
+        value = 'W/' + value
+    return value
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, the one required for GET and HEAD requests
+    if if_none_match.strip() == '*':
+        return True
+    opaque_tag = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == opaque_tag:
+            return True
+    return False
+
+
+# Case-insensitive multimap following the wsgiref.headers.Headers interface
+class HeaderMap:
+    __slots__ = ('_headers', )
+
+    def __init__(self: 'HeaderMap', headers: Optional[Iterable[Tuple[str, str]]] = None):
+        self._headers: Dict[str, Tuple[str, List[str]]] = dict()
+        if headers is not None:
+            for name, value in headers:
+                self.add_header(name, value)
+
+    def add_header(self: 'HeaderMap', name: str, value: str, **params: Any):
+        if params:
+            value = format_header_value(value, **params)
+        entry = self._headers.get(name.lower())
+        if entry is None:
+            self._headers[name.lower()] = (name, [value])
+        else:
+            entry[1].append(value)
+
+    def get(self: 'HeaderMap', name: str, default: Any = None) -> Any:
+        entry = self._headers.get(name.lower())
+        return entry[1][0] if entry is not None else default
+
+    def get_all(self: 'HeaderMap', name: str) -> List[str]:
+        entry = self._headers.get(name.lower())
+        return list(entry[1]) if entry is not None else []
+
+    def setdefault(self: 'HeaderMap', name: str, value: str) -> str:
+        entry = self._headers.get(name.lower())
+        if entry is None:
+            self._headers[name.lower()] = (name, [value])
+            return value
+        return entry[1][0]
+
+    def items(self: 'HeaderMap') -> WsgiHeaders:
+        return [(name, value) for name, values in self._headers.values() for value in values]
+
+    def keys(self: 'HeaderMap') -> List[str]:
+        return [name for name, values in self._headers.values() for _ in values]
+
+    def values(self: 'HeaderMap') -> List[str]:
+        return [value for _, values in self._headers.values() for value in values]
+
+    def __getitem__(self: 'HeaderMap', name: str) -> Optional[str]:
+        return self.get(name)
+
+    def __setitem__(self: 'HeaderMap', name: str, value: str):
+        self._headers[name.lower()] = (name, [value])
+
+    def __delitem__(self: 'HeaderMap', name: str):
+        self._headers.pop(name.lower(), None)
+
+    def __contains__(self: 'HeaderMap', name: object) -> bool:
+        return isinstance(name, str) and name.lower() in self._headers
+
+    def __len__(self: 'HeaderMap') -> int:
+        return sum(len(values) for _, values in self._headers.values())
+
+    def __repr__(self: 'HeaderMap') -> str:
+        return 'HeaderMap(%r)' % self.items()
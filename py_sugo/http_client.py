@@ -5,20 +5,20 @@ import mimetypes
 from typing import Any, Dict, List, Tuple, Union, TextIO, cast
 from http.client import HTTPResponse, HTTPConnection
 from urllib.parse import urlparse
-from wsgiref.headers import Headers
 
 # First party libs imports
 from py_sugo.core import GET, PUT, HEAD, POST, PATCH, UTF_8, DELETE, OPTIONS, CONTENT_TYPE, CONTENT_LENGTH
+from py_sugo.headers import HeaderMap
 
 
 class HttpResponse:
     status_code: int
     data: Union[Dict, bytes]
-    header: Headers
+    header: HeaderMap
     message: str
     url: str
 
-    def __init__(self, status_code: int, headers: Headers, message: str, url: str, data: Dict = None):
+    def __init__(self, status_code: int, headers: HeaderMap, message: str, url: str, data: Dict = None):
         self.status_code = status_code
         self.headers = headers
         self.message = message
@@ -62,7 +62,7 @@ class HttpClient:
         else:
             response_body = byte_response
         response = HttpResponse(status_code=native_response.status,
-                                headers=Headers(native_response.getheaders()),
+                                headers=HeaderMap(native_response.getheaders()),
                                 message=native_response.reason,
                                 url=complete_url,
                                 data=response_body)
@@ -0,0 +1,108 @@
+# Standard libs imports
+import time
+import signal
+from typing import Any, Dict, List, Callable, Optional
+from threading import Event, Condition, current_thread, main_thread
+
+# First party libs imports
+from py_sugo.middleware import logger
+
+Hook = Callable[[], Any]
+DrainProgressHook = Callable[[int, float], Any]
+PendingCounter = Callable[[], int]
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class Lifecycle:
+    drain_timeout: float
+    in_flight: int
+    startup_hooks: List[Hook]
+    shutdown_hooks: List[Hook]
+    drain_progress_hooks: List[DrainProgressHook]
+
+    def __init__(self: 'Lifecycle', drain_timeout: float = 30.0):
+        self.drain_timeout = drain_timeout
+        self.in_flight = 0
+        self.startup_hooks = list()
+        self.shutdown_hooks = list()
+        self.drain_progress_hooks = list()
+        self._idle = Condition()
+        self._stop_requested = Event()
+        self._previous_handlers: Dict[int, Any] = dict()
+
+    def on_startup(self: 'Lifecycle', hook: Hook) -> Hook:
+        self.startup_hooks.append(hook)
+        return hook
+
+    def on_shutdown(self: 'Lifecycle', hook: Hook) -> Hook:
+        self.shutdown_hooks.append(hook)
+        return hook
+
+    def on_drain_progress(self: 'Lifecycle', hook: DrainProgressHook) -> DrainProgressHook:
+        self.drain_progress_hooks.append(hook)
+        return hook
+
+    def run_startup_hooks(self: 'Lifecycle'):
+        self.clear_stop_request()
+        for hook in self.startup_hooks:
+            hook()
+
+    def run_shutdown_hooks(self: 'Lifecycle'):
+        # Hooks run in reverse order, so resources are released in the opposite order they were acquired
+        for hook in reversed(self.shutdown_hooks):
+            try:
+                hook()
+            except Exception:
+                logger.exception("Shutdown hook %r failed", hook)
+
+    def request_started(self: 'Lifecycle'):
+        with self._idle:
+            self.in_flight += 1
+
+    def request_finished(self: 'Lifecycle'):
+        with self._idle:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.notify_all()
+
+    def request_stop(self: 'Lifecycle', *args: Any):
+        self._stop_requested.set()
+
+    def clear_stop_request(self: 'Lifecycle'):
+        self._stop_requested.clear()
+
+    def install_signal_handlers(self: 'Lifecycle') -> bool:
+        if current_thread() is not main_thread():
+            return False
+        for signal_number in STOP_SIGNALS:
+            self._previous_handlers[signal_number] = signal.signal(signal_number, self.request_stop)
+        return True
+
+    def restore_signal_handlers(self: 'Lifecycle'):
+        for signal_number, handler in self._previous_handlers.items():
+            signal.signal(signal_number, handler)
+        self._previous_handlers = dict()
+
+    def wait_for_stop(self: 'Lifecycle', is_running: Callable[[], bool], poll_interval: float = 1.0):
+        # The timeout only exists to notice a server that died on its own, the thread sleeps in between
+        while not self._stop_requested.wait(poll_interval):
+            if not is_running():
+                return
+
+    def drain(self: 'Lifecycle', pending: Optional[PendingCounter] = None, timeout: Optional[float] = None) -> bool:
+        timeout = self.drain_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while True:
+                remaining_requests = self.in_flight + (pending() if pending is not None else 0)
+                remaining_time = deadline - time.monotonic()
+                if remaining_requests == 0:
+                    return True
+                if remaining_time <= 0:
+                    logger.warning("Drain timed out with %d requests in flight", remaining_requests)
+                    return False
+                logger.info("Draining %d requests in flight, %.1fs left", remaining_requests, remaining_time)
+                for hook in self.drain_progress_hooks:
+                    hook(remaining_requests, remaining_time)
+                self._idle.wait(min(remaining_time, 1.0))
@@ -0,0 +1,178 @@
+# Standard libs imports
+import copy
+import json
+import time
+import queue
+import random
+import logging
+from typing import Any, Set, Dict, Tuple, Iterable, Optional
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import NextFunction, logger
+
+REDACTED: str = '[REDACTED]'
+REDACTED_FIELDS: Tuple[str, ...] = ('password', 'token', 'secret', 'authorization', 'api_key', 'cookie')
+
+
+def truncate(value: Any, limit: int) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value[:limit]).decode('utf-8', 'replace') + ('...' if len(value) > limit else '')
+    elif isinstance(value, str) and len(value) > limit:
+        value = value[:limit] + '...'
+    return value
+
+
+def redact(value: Any, fields: Iterable[str], limit: int) -> Any:
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in fields else redact(item, fields, limit) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, fields, limit) for item in value]
+    if isinstance(value, (str, bytes, bytearray)):
+        return truncate(value, limit)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return truncate(repr(value), limit)
+
+
+# Fields given with extra={"fields": {...}} are merged into the JSON object
+class JsonFormatter(logging.Formatter):
+    def format(self: 'JsonFormatter', record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+# Formatting is left to the writer thread, records are dropped when the queue is full
+class DeferredQueueHandler(QueueHandler):
+    dropped: int
+
+    def __init__(self: 'DeferredQueueHandler', log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self: 'DeferredQueueHandler', record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+    def enqueue(self: 'DeferredQueueHandler', record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Without handlers on the logger, records are written to stderr as JSON
+class AsyncLogPipeline:
+    logger: logging.Logger
+    queue_size: int
+    handler: Optional[DeferredQueueHandler]
+    listener: Optional[QueueListener]
+
+    def __init__(self: 'AsyncLogPipeline', target_logger: logging.Logger = logger, queue_size: int = 10000):
+        self.logger = target_logger
+        self.queue_size = queue_size
+        self.handler = None
+        self.listener = None
+        self._handlers: Tuple[logging.Handler, ...] = ()
+
+    @property
+    def dropped(self: 'AsyncLogPipeline') -> int:
+        return self.handler.dropped if self.handler is not None else 0
+
+    def start(self: 'AsyncLogPipeline'):
+        if self.listener is not None:
+            return
+        handlers = tuple(self.logger.handlers)
+        if not handlers:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(JsonFormatter())
+            handlers = (stream_handler, )
+        self._handlers = handlers
+        log_queue: queue.Queue = queue.Queue(self.queue_size)
+        self.handler = DeferredQueueHandler(log_queue)
+        for handler in tuple(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(self.handler)
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self: 'AsyncLogPipeline'):
+        if self.listener is None:
+            return
+        # Flushes whatever is still queued before putting the handlers back
+        self.listener.stop()
+        self.listener = None
+        self.logger.removeHandler(self.handler)
+        for handler in self._handlers:
+            self.logger.addHandler(handler)
+
+
+# Server errors are logged whatever the sample rate
+class RequestLogMiddleware:
+    logger: logging.Logger
+    sample_rate: float
+    sample_rates: Dict[str, float]
+    max_body_size: int
+    log_bodies: bool
+    redacted_fields: Set[str]
+
+    def __init__(self: 'RequestLogMiddleware',
+                 target_logger: logging.Logger = logger,
+                 sample_rate: float = 1.0,
+                 sample_rates: Optional[Dict[str, float]] = None,
+                 max_body_size: int = 1024,
+                 log_bodies: bool = True,
+                 redacted_fields: Iterable[str] = REDACTED_FIELDS):
+        self.logger = target_logger
+        self.sample_rate = sample_rate
+        self.sample_rates = dict(sample_rates or {})
+        self.max_body_size = max_body_size
+        self.log_bodies = log_bodies
+        self.redacted_fields = {field.lower() for field in redacted_fields}
+
+    def __call__(self: 'RequestLogMiddleware', request: Request, response: Response, next_layer: NextFunction):
+        if not self.logger.isEnabledFor(logging.INFO) or not self.logger.hasHandlers():
+            return next_layer()
+        started_at = time.perf_counter()
+        try:
+            result = next_layer()
+        except Exception:
+            # The error is answered by an outer layer, the status it will send isn't known yet
+            self.log(request, response, time.perf_counter() - started_at, 500)
+            raise
+        if response.status_code >= 500 or self.is_sampled(request):
+            self.log(request, response, time.perf_counter() - started_at, response.status_code)
+        return result
+
+    def is_sampled(self: 'RequestLogMiddleware', request: Request) -> bool:
+        rate = self.sample_rates.get(request.route, self.sample_rate) if request.route is not None else self.sample_rate
+        return rate >= 1.0 or random.random() < rate
+
+    def log(self: 'RequestLogMiddleware', request: Request, response: Response, duration: float, status_code: int):
+        fields: Dict[str, Any] = {
+            "request_id": request.id,
+            "method": request.method,
+            "path": request.path,
+            "route": request.route,
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "response_size": len(response.body) if response.iterable is None and response.file is None else None,
+        }
+        if self.log_bodies:
+            fields['query'] = redact(request.query, self.redacted_fields, self.max_body_size)
+            fields['request_body'] = redact(request.body, self.redacted_fields, self.max_body_size)
+            fields['response_body'] = truncate(response.body, self.max_body_size)
+        level = logging.ERROR if status_code >= 500 else logging.INFO
+        self.logger.log(level, '%s %s --> %d', request.method, request.path, status_code, extra={"fields": fields})
@@ -0,0 +1,166 @@
+# Standard libs imports
+import time
+import bisect
+import threading
+from typing import Any, Dict, List, Tuple, Optional, Sequence
+from threading import Lock
+
+# First party libs imports
+from py_sugo.core import CONTENT_TYPE, CONTENT_LENGTH
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import NextFunction
+
+SeriesKey = Tuple[str, str, str]
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE: str = '<unmatched>'
+PROMETHEUS_CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Series:
+    __slots__ = ('count', 'duration', 'buckets', 'request_bytes', 'response_bytes')
+
+    def __init__(self: 'Series', bucket_count: int):
+        self.count = 0
+        self.duration = 0.0
+        # One slot per bucket plus the +Inf one, the counts are cumulated when rendering
+        self.buckets = [0] * (bucket_count + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+# Only updated by its own thread, recording a request takes no lock
+class MetricsShard:
+    __slots__ = ('series', 'started', 'finished', 'thread')
+
+    def __init__(self: 'MetricsShard', thread: Optional[threading.Thread] = None):
+        self.series: Dict[SeriesKey, Series] = dict()
+        self.started = 0
+        self.finished = 0
+        self.thread = thread
+
+    def merge(self: 'MetricsShard', other: 'MetricsShard', bucket_count: int):
+        self.started += other.started
+        self.finished += other.finished
+        for key, series in list(other.series.items()):
+            total = self.series.get(key)
+            if total is None:
+                total = self.series[key] = Series(bucket_count)
+            total.count += series.count
+            total.duration += series.duration
+            total.request_bytes += series.request_bytes
+            total.response_bytes += series.response_bytes
+            for index, observations in enumerate(series.buckets):
+                total.buckets[index] += observations
+
+
+class MetricsMiddleware:
+    buckets: Tuple[float, ...]
+    prefix: str
+
+    def __init__(self: 'MetricsMiddleware', buckets: Sequence[float] = DEFAULT_BUCKETS, prefix: str = 'py_sugo'):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._shards: List[MetricsShard] = list()
+        self._shards_lock = Lock()
+        self._retired = MetricsShard()
+        self._local = threading.local()
+
+    def __call__(self: 'MetricsMiddleware', request: Request, response: Response, next_layer: NextFunction):
+        shard = self._shard()
+        shard.started += 1
+        started_at = time.perf_counter()
+        status_code = 500
+        try:
+            result = next_layer()
+            status_code = response.status_code
+            return result
+        finally:
+            self.observe(shard, request, response, status_code, time.perf_counter() - started_at)
+            shard.finished += 1
+
+    def observe(self: 'MetricsMiddleware', shard: MetricsShard, request: Request, response: Response, status_code: int, duration: float):
+        key = (request.method, request.route or UNMATCHED_ROUTE, '%dxx' % (status_code // 100))
+        series = shard.series.get(key)
+        if series is None:
+            series = shard.series[key] = Series(len(self.buckets))
+        series.count += 1
+        series.duration += duration
+        series.buckets[bisect.bisect_left(self.buckets, duration)] += 1
+        series.request_bytes += request.content_length or 0
+        series.response_bytes += self._response_size(response)
+
+    def handle(self: 'MetricsMiddleware', request: Request, response: Response):
+        response.headers[CONTENT_TYPE] = PROMETHEUS_CONTENT_TYPE
+        return response.send(self.render().encode('utf-8'))
+
+    def router(self: 'MetricsMiddleware', path: str = '/metrics') -> Router:
+        return Router().get(path, self.handle)
+
+    def snapshot(self: 'MetricsMiddleware') -> Tuple[Dict[SeriesKey, Series], int]:
+        with self._shards_lock:
+            # Shards of finished threads are folded into one, so threads created per request don't pile up
+            for shard in [shard for shard in self._shards if shard.thread is not None and not shard.thread.is_alive()]:
+                self._retired.merge(shard, len(self.buckets))
+                self._shards.remove(shard)
+            merged = MetricsShard()
+            merged.merge(self._retired, len(self.buckets))
+            shards = list(self._shards)
+        for shard in shards:
+            merged.merge(shard, len(self.buckets))
+        return merged.series, merged.started - merged.finished
+
+    def render(self: 'MetricsMiddleware') -> str:
+        merged, in_flight = self.snapshot()
+        prefix = self.prefix
+        lines = [
+            '# HELP %s_requests_in_flight Requests being handled' % prefix,
+            '# TYPE %s_requests_in_flight gauge' % prefix,
+            '%s_requests_in_flight %d' % (prefix, max(in_flight, 0)),
+        ]
+        series_items = sorted(merged.items())
+        labels = {key: 'method="%s",route="%s",status="%s"' % tuple(escape_label(value) for value in key) for key in merged}
+        for name, help_text, attribute in [('requests_total', 'Handled requests', 'count'),
+                                           ('request_size_bytes_total', 'Request body bytes', 'request_bytes'),
+                                           ('response_size_bytes_total', 'Response body bytes', 'response_bytes')]:
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for key, series in series_items:
+                lines.append('%s_%s{%s} %d' % (prefix, name, labels[key], getattr(series, attribute)))
+        lines.append('# HELP %s_request_duration_seconds Request latency' % prefix)
+        lines.append('# TYPE %s_request_duration_seconds histogram' % prefix)
+        for key, series in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'), ), series.buckets):
+                cumulative += bucket_count
+                bound_label = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_request_duration_seconds_bucket{%s,le="%s"} %d' % (prefix, labels[key], bound_label, cumulative))
+            lines.append('%s_request_duration_seconds_sum{%s} %r' % (prefix, labels[key], series.duration))
+            lines.append('%s_request_duration_seconds_count{%s} %d' % (prefix, labels[key], series.count))
+        return '\n'.join(lines) + '\n'
+
+    def stats(self: 'MetricsMiddleware') -> Dict[str, Any]:
+        merged, in_flight = self.snapshot()
+        return {"requests": sum(series.count for series in merged.values()), "in_flight": max(in_flight, 0)}
+
+    def _shard(self: 'MetricsMiddleware') -> MetricsShard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = MetricsShard(threading.current_thread())
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    @staticmethod
+    def _response_size(response: Response) -> int:
+        if response.file is not None:
+            return response.file_length
+        if response.iterable is not None:
+            return int(response.headers.get(CONTENT_LENGTH) or 0)
+        return len(response.body)
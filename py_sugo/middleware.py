@@ -1,16 +1,27 @@
 # Standard libs imports
-import io
+import os
 import cgi
+import gzip
 import json
+import mmap
+import time
+import zlib
+import random
+import hashlib
 import logging
+import mimetypes
 import traceback
-from typing import Any, Dict, List, Callable
+from typing import Any, Dict, List, Tuple, Callable, Iterator, Optional, Sequence
 from datetime import datetime
+from threading import Lock
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
 
 # First party libs imports
-from py_sugo.core import CONTENT_TYPE
+from py_sugo.core import GET, HEAD, UTF_8, CONTENT_TYPE
+from py_sugo.headers import format_etag, etag_matches
 from py_sugo.request import Request
-from py_sugo.response import Response
+from py_sugo.response import STATUS_LINES, Response
 
 NextFunction = Callable[[], Any]
 Middleware = Callable[[Request, Response, NextFunction], Any]
@@ -19,6 +30,39 @@ RequestHandler = Callable[[Request, Response], Any]
 logger = logging.Logger('APP_LOGGER')
 
 
+# The position in the chain lives in a per-request cursor, one chain serves any number of concurrent requests
+class MiddlewareChain:
+    layers: Tuple[Middleware, ...]
+    handler: RequestHandler
+
+    def __init__(self: 'MiddlewareChain', layers: Sequence[Middleware], handler: RequestHandler):
+        self.layers = tuple(layers)
+        self.handler = handler
+
+    def __call__(self: 'MiddlewareChain', request: Request, response: Response) -> Any:
+        if not self.layers:
+            return self.handler(request, response)
+        return ChainCursor(self, request, response)()
+
+
+class ChainCursor:
+    __slots__ = ('chain', 'request', 'response', 'position')
+
+    def __init__(self: 'ChainCursor', chain: MiddlewareChain, request: Request, response: Response):
+        self.chain = chain
+        self.request = request
+        self.response = response
+        self.position = 0
+
+    def __call__(self: 'ChainCursor') -> Any:
+        position = self.position
+        layers = self.chain.layers
+        if position >= len(layers):
+            return self.chain.handler(self.request, self.response)
+        self.position = position + 1
+        return layers[position](self.request, self.response, self)
+
+
 class FileData():
     def __init__(self: 'FileData', content: bytes, filename: str, content_type: str):
         self.content = content
@@ -31,7 +75,7 @@ def parse_body_form_data(request: Request, response: Response, next_layer: NextF
     assert content_type is not None
     is_form_data = content_type.find('multipart/form-data') >= 0
     if is_form_data:
-        form_data: cgi.FieldStorage = cgi.FieldStorage(fp=io.BytesIO(request.raw_body), environ=request.environ, keep_blank_values=True)
+        form_data: cgi.FieldStorage = cgi.FieldStorage(fp=request.body_file, environ=request.environ, keep_blank_values=True)
         assert form_data.list is not None
         field_storages: List[cgi.FieldStorage] = form_data.list
         files: Dict[str, FileData] = dict()
@@ -58,10 +102,32 @@ def parse_body_json(request: Request, response: Response, next_layer: NextFuncti
     return next_layer()
 
 
-def handle_errors(request: Request, response: Response, next_layer: NextFunction):
-    try:
-        return next_layer()
-    except Exception as exception:
+# Tracebacks are sampled and rate limited in production mode, an error storm must not bottleneck on logging
+class ErrorHandler:
+    debug: bool
+    traceback_sample_rate: float
+    max_tracebacks_per_second: Optional[float]
+    suppressed_tracebacks: int
+
+    def __init__(self: 'ErrorHandler', debug: bool = True, traceback_sample_rate: float = 1.0, max_tracebacks_per_second: Optional[float] = 10.0):
+        self.debug = debug
+        self.traceback_sample_rate = traceback_sample_rate
+        self.max_tracebacks_per_second = max_tracebacks_per_second
+        self.suppressed_tracebacks = 0
+        self._templates: Dict[Tuple[type, int], str] = dict()
+        self._tokens = max_tracebacks_per_second or 0.0
+        self._refilled_at = time.monotonic()
+        self._lock = Lock()
+
+    def __call__(self: 'ErrorHandler', request: Request, response: Response, next_layer: NextFunction):
+        try:
+            return next_layer()
+        except Exception as exception:
+            if self.debug:
+                return self.send_debug_error(request, response, exception)
+            return self.send_error(request, response, exception)
+
+    def send_debug_error(self: 'ErrorHandler', request: Request, response: Response, exception: Exception):
         log_format: str = "%s Error Response (%s): %s %s --> status: %d | body: %s"
         req_id = request.id
         method = request.method
@@ -77,34 +143,89 @@ def handle_errors(request: Request, response: Response, next_layer: NextFunction
         status_code = getattr(exception, 'status_code', 500)
         now = datetime.now().isoformat()
         logger.error(log_format, now, req_id, method, path, status_code, str(body))
+        response.clear()
         response.status(status_code)
         response.json(body)
-        return
+
+    def send_error(self: 'ErrorHandler', request: Request, response: Response, exception: Exception):
+        status_code = getattr(exception, 'status_code', 500)
+        if not isinstance(status_code, int) or status_code not in STATUS_LINES:
+            status_code = 500
+        template = self._templates.get((type(exception), status_code))
+        if template is None:
+            template = self._compile_template(type(exception), status_code)
+        message = str(getattr(exception, 'message', exception)) if status_code < 500 else STATUS_LINES[status_code][4:]
+        response.clear()
+        response.status(status_code).headers[CONTENT_TYPE] = 'application/json'
+        response.send((template % (json.dumps(request.id), json.dumps(message))).encode(UTF_8))
+        if status_code >= 500:
+            self.log_error(request, status_code, exception)
+
+    def log_error(self: 'ErrorHandler', request: Request, status_code: int, exception: Exception):
+        log_format: str = "Error Response (%s): %s %s --> status: %d | error: %r"
+        if self._should_log_traceback():
+            with self._lock:
+                suppressed, self.suppressed_tracebacks = self.suppressed_tracebacks, 0
+            log_format += ' | tracebacks suppressed since the last one: %d'
+            logger.error(log_format, request.id, request.method, request.path, status_code, exception, suppressed, exc_info=exception)
+        else:
+            logger.error(log_format, request.id, request.method, request.path, status_code, exception)
+
+    def _should_log_traceback(self: 'ErrorHandler') -> bool:
+        if self.traceback_sample_rate < 1.0 and random.random() >= self.traceback_sample_rate:
+            return self._suppress()
+        if self.max_tracebacks_per_second is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_tracebacks_per_second, self._tokens + (now - self._refilled_at) * self.max_tracebacks_per_second)
+            self._refilled_at = now
+            if self._tokens < 1.0:
+                self.suppressed_tracebacks += 1
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def _suppress(self: 'ErrorHandler') -> bool:
+        with self._lock:
+            self.suppressed_tracebacks += 1
+        return False
+
+    def _compile_template(self: 'ErrorHandler', exception_class: type, status_code: int) -> str:
+        # Only the request id and message change between two errors of the same class and status
+        fixed = json.dumps({"error": exception_class.__name__, "status_code": status_code})
+        template = fixed[:-1].replace('%', '%%') + ', "request_id": %s, "message": %s}'
+        self._templates[(exception_class, status_code)] = template
+        return template
+
+
+handle_errors = ErrorHandler()
+
+
+class LazyStr:
+    __slots__ = ('value', 'limit')
+
+    def __init__(self: 'LazyStr', value: Any, limit: int = 1024):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self: 'LazyStr') -> str:
+        text = str(self.value)
+        return text if len(text) <= self.limit else text[:self.limit] + '...'
 
 
 def log_request(request: Request, response: Response, next_layer: NextFunction):
-    log_format: str = "%s Request (%s): %s %s --> body: %s | query: %s "
-    req_id = request.id
-    method = request.method
-    path = request.path
-    body = str(request.body)
-    query = str(request.query)
-    now = datetime.now().isoformat()
-    logger.info(log_format, now, req_id, method, path, body, query)
+    if logger.isEnabledFor(logging.INFO):
+        log_format: str = "Request (%s): %s %s --> body: %s | query: %s "
+        logger.info(log_format, request.id, request.method, request.path, LazyStr(request.body), LazyStr(request.query))
     return next_layer()
 
 
 def log_response(request: Request, response: Response, next_layer: NextFunction):
     next_layer()
-    log_format: str = "%s Response (%s): %s %s --> status: %d | body: %s"
-    req_id = request.id
-    method = request.method
-    path = request.path
-    body = str(response.body)
-    query = str(request.query)
-    status_code = response.status_code
-    now = datetime.now().isoformat()
-    logger.info(log_format, now, req_id, method, path, status_code, body)
+    if logger.isEnabledFor(logging.INFO):
+        log_format: str = "Response (%s): %s %s --> status: %d | body: %s"
+        logger.info(log_format, request.id, request.method, request.path, response.status_code, LazyStr(response.body))
     return
 
 
@@ -130,3 +251,335 @@ class CorsMiddleware:
             return next_layer()
 
         return fn
+
+
+class StaticFile:
+    __slots__ = ('path', 'size', 'modified', 'etag', 'last_modified', 'content_type')
+
+    def __init__(self: 'StaticFile', path: str, stat: os.stat_result):
+        self.path = path
+        self.size = stat.st_size
+        self.modified = int(stat.st_mtime)
+        self.etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    # None when the header can't be understood, an empty list when no range can be satisfied
+    unit, _, ranges = value.partition('=')
+    if unit.strip().lower() != 'bytes' or not ranges:
+        return None
+    parsed: List[Tuple[int, int]] = list()
+    for byte_range in ranges.split(','):
+        start, separator, end = byte_range.strip().partition('-')
+        if not separator:
+            return None
+        try:
+            if not start:
+                suffix = int(end)
+                if suffix > 0 and size > 0:
+                    parsed.append((max(size - suffix, 0), size - 1))
+                continue
+            first, last = int(start), int(end) if end else None
+        except ValueError:
+            return None
+        if last is None:
+            last = size - 1
+        elif first > last:
+            return None
+        if first < size:
+            parsed.append((first, min(last, size - 1)))
+    return parsed
+
+
+class StaticFilesMiddleware:
+    directory: str
+    prefix: str
+    index: Optional[str]
+    max_age: Optional[int]
+    check_interval: float
+    cache_size: int
+    max_ranges: int
+
+    def __init__(self: 'StaticFilesMiddleware',
+                 directory: str,
+                 prefix: str = '/',
+                 index: Optional[str] = 'index.html',
+                 max_age: Optional[int] = None,
+                 check_interval: float = 1.0,
+                 cache_size: int = 1024,
+                 max_ranges: int = 16):
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix if prefix.endswith('/') else prefix + '/'
+        self.index = index
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self.max_ranges = max_ranges
+        # Misses are cached too, with the time they were checked, so a file created later shows up after check_interval
+        self._files: 'OrderedDict[str, Tuple[float, Optional[StaticFile]]]' = OrderedDict()
+        self._lock = Lock()
+
+    def __call__(self: 'StaticFilesMiddleware', request: Request, response: Response, next_layer: NextFunction):
+        if request.method not in (GET, HEAD) or not (request.path + '/').startswith(self.prefix):
+            return next_layer()
+        static_file = self.find_file(request.path[len(self.prefix):])
+        if static_file is None:
+            return next_layer()
+        response.headers['ETag'] = static_file.etag
+        response.headers['Last-Modified'] = static_file.last_modified
+        response.headers['Accept-Ranges'] = 'bytes'
+        if self.max_age is not None:
+            response.headers['Cache-Control'] = 'public, max-age=%d' % self.max_age
+        if self.is_not_modified(request, static_file):
+            response.status(304)
+            return response.send(b'')
+        byte_ranges = self.get_ranges(request, static_file)
+        if byte_ranges is not None and not byte_ranges:
+            response.status(416).headers['Content-Range'] = 'bytes */%d' % static_file.size
+            return response.send(b'')
+        if byte_ranges is None:
+            return self.send_range(request, response, static_file, 0, static_file.size)
+        response.status(206)
+        if len(byte_ranges) == 1:
+            start, end = byte_ranges[0]
+            response.headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, static_file.size)
+            return self.send_range(request, response, static_file, start, end - start + 1)
+        return self.send_multipart(request, response, static_file, byte_ranges)
+
+    def find_file(self: 'StaticFilesMiddleware', relative_path: str) -> Optional[StaticFile]:
+        now = time.monotonic()
+        with self._lock:
+            if relative_path in self._files:
+                checked_at, static_file = self._files[relative_path]
+                if now - checked_at < self.check_interval:
+                    self._files.move_to_end(relative_path)
+                    return static_file
+        static_file = self._stat(relative_path)
+        with self._lock:
+            self._files[relative_path] = (now, static_file)
+            self._files.move_to_end(relative_path)
+            while len(self._files) > self.cache_size:
+                self._files.popitem(last=False)
+        return static_file
+
+    def clear_cache(self: 'StaticFilesMiddleware'):
+        with self._lock:
+            self._files.clear()
+
+    def is_not_modified(self: 'StaticFilesMiddleware', request: Request, static_file: StaticFile) -> bool:
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag_matches(if_none_match, static_file.etag)
+        if_modified_since = request.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                return static_file.modified <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def get_ranges(self: 'StaticFilesMiddleware', request: Request, static_file: StaticFile) -> Optional[List[Tuple[int, int]]]:
+        range_header = request.headers.get('Range')
+        if range_header is None or request.headers.get('If-Range', static_file.etag) not in (static_file.etag, static_file.last_modified):
+            return None
+        byte_ranges = parse_range_header(range_header, static_file.size)
+        if byte_ranges is not None and len(byte_ranges) > self.max_ranges:
+            return None
+        return byte_ranges
+
+    def send_range(self: 'StaticFilesMiddleware', request: Request, response: Response, static_file: StaticFile, offset: int, length: int):
+        if request.method == HEAD:
+            response.headers[CONTENT_TYPE] = static_file.content_type
+            return response.stream([], length)
+        response.send_file(static_file.path, offset, length, static_file.content_type)
+
+    def send_multipart(self: 'StaticFilesMiddleware',
+                       request: Request,
+                       response: Response,
+                       static_file: StaticFile,
+                       byte_ranges: List[Tuple[int, int]]):
+        boundary = os.urandom(12).hex()
+        part_heads = [('--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n' %
+                       (boundary, static_file.content_type, start, end, static_file.size)).encode('ascii') for start, end in byte_ranges]
+        tail = ('--%s--\r\n' % boundary).encode('ascii')
+        length = sum(len(head) + end - start + 3 for head, (start, end) in zip(part_heads, byte_ranges)) + len(tail)
+        response.headers[CONTENT_TYPE] = 'multipart/byteranges; boundary=%s' % boundary
+        if request.method == HEAD:
+            return response.stream([], length)
+        response.stream(self._iter_parts(static_file.path, part_heads, byte_ranges, tail), length)
+
+    @staticmethod
+    def _iter_parts(path: str, part_heads: List[bytes], byte_ranges: List[Tuple[int, int]], tail: bytes) -> Iterator[bytes]:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for head, (start, end) in zip(part_heads, byte_ranges):
+                yield head
+                yield mapped[start:end + 1]
+                yield b'\r\n'
+        yield tail
+
+    def _stat(self: 'StaticFilesMiddleware', relative_path: str) -> Optional[StaticFile]:
+        path = os.path.realpath(os.path.join(self.directory, relative_path.lstrip('/')))
+        # Symlinks and dot segments must not escape the served directory
+        if path != self.directory and not path.startswith(self.directory + os.sep):
+            return None
+        try:
+            stat = os.stat(path)
+            if os.path.isdir(path) and self.index is not None:
+                path = os.path.join(path, self.index)
+                stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        return StaticFile(path, stat)
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    encodings: Dict[str, float] = dict()
+    for item in value.split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, param_value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+# Compressed bodies are cached by a hash of the content, a repeated payload is compressed once
+class CompressionMiddleware:
+    encodings: Tuple[str, ...] = ('gzip', 'deflate')
+    compressible_types: Tuple[str, ...] = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                                           'image/svg+xml', 'application/x-ndjson')
+    minimum_size: int
+    level: int
+    cache_size: int
+    cache_bytes: int
+    max_cached_body: int
+    max_file_size: int
+
+    def __init__(self: 'CompressionMiddleware',
+                 minimum_size: int = 1024,
+                 level: int = 6,
+                 cache_size: int = 256,
+                 max_file_size: int = 1024 * 1024,
+                 cache_bytes: int = 16 * 1024 * 1024,
+                 max_cached_body: int = 256 * 1024):
+        self.minimum_size = minimum_size
+        self.level = level
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self.max_cached_body = max_cached_body
+        self.max_file_size = max_file_size
+        self._cache: 'OrderedDict[Tuple[bytes, str], bytes]' = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = Lock()
+
+    def __call__(self: 'CompressionMiddleware', request: Request, response: Response, next_layer: NextFunction):
+        result = next_layer()
+        content_type = response.headers.get(CONTENT_TYPE, '')
+        if not content_type.startswith(self.compressible_types):
+            return result
+        vary = response.headers.get('Vary')
+        if vary is None:
+            response.headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            response.headers['Vary'] = '%s, Accept-Encoding' % vary
+        encoding = self.negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None or request.method == HEAD or not self._is_compressible(response):
+            return result
+        # Static files and ETagged bodies are the ones likely to be sent again, dynamic bodies are not worth keeping
+        cache = response.file is not None or 'ETag' in response.headers
+        body = self._take_body(response)
+        compressed = self.compress(body, encoding, cache)
+        response.clear(keep_headers=True)
+        if len(compressed) >= len(body):
+            response.send(body)
+            return result
+        response.send(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag = response.headers.get('ETag')
+        # The bytes on the wire changed, a strong validator would no longer describe them
+        if etag is not None and not etag.startswith('W/'):
+            response.headers['ETag'] = 'W/' + etag
+        return result
+
+    def negotiate(self: 'CompressionMiddleware', accept_encoding: str) -> Optional[str]:
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get('*', 0.0)
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, wildcard)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self: 'CompressionMiddleware', body: bytes, encoding: str, cache: bool = True) -> bytes:
+        if not cache or len(body) > self.max_cached_body:
+            return self._compress(body, encoding)
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+                return compressed
+        compressed = self._compress(body, encoding)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compressed
+                self._cached_bytes += len(compressed)
+            while len(self._cache) > self.cache_size or self._cached_bytes > self.cache_bytes:
+                self._cached_bytes -= len(self._cache.popitem(last=False)[1])
+        return compressed
+
+    def _compress(self: 'CompressionMiddleware', body: bytes, encoding: str) -> bytes:
+        if encoding == 'gzip':
+            return gzip.compress(body, self.level, mtime=0)
+        return zlib.compress(body, self.level)
+
+    def _is_compressible(self: 'CompressionMiddleware', response: Response) -> bool:
+        if response.status_code < 200 or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers:
+            return False
+        if response.file is not None:
+            return self.minimum_size <= response.file_length <= self.max_file_size
+        return response.iterable is None and len(response.body) >= self.minimum_size
+
+    @staticmethod
+    def _take_body(response: Response) -> bytes:
+        if response.file is None:
+            return response.body
+        with response.file as file:
+            body = file.read(response.file_length)
+        response.file = None
+        return body
+
+
+class ETagMiddleware:
+    weak: bool
+
+    def __init__(self: 'ETagMiddleware', weak: bool = False):
+        self.weak = weak
+
+    def __call__(self: 'ETagMiddleware', request: Request, response: Response, next_layer: NextFunction):
+        result = next_layer()
+        if request.method not in (GET, HEAD) or response.status_code != 200:
+            return result
+        etag = response.headers.get('ETag')
+        if etag is None:
+            if response.iterable is not None or response.file is not None:
+                return result
+            etag = format_etag(hashlib.blake2b(response.body, digest_size=16).hexdigest(), self.weak)
+            response.headers['ETag'] = etag
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            response.clear(keep_headers=True)
+            del response.headers[CONTENT_TYPE]
+            response.status(304).send(b'')
+        return result
@@ -0,0 +1,158 @@
+# Standard libs imports
+import time
+import pstats
+import random
+import cProfile
+from typing import Any, Dict, List, Optional, Sequence
+from threading import Lock
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import Middleware, NextFunction, RequestHandler, MiddlewareChain
+
+
+def layer_name(layer: Any) -> str:
+    return getattr(layer, '__qualname__', None) or type(layer).__name__
+
+
+class LayerStats:
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self: 'LayerStats'):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+# Layers are charged for their own time only, without the time spent further down the chain
+class Profiler:
+    profile_rate: float
+    threshold: Optional[float]
+    dump_path: Optional[str]
+    dump_every: int
+    profiled_requests: int
+
+    def __init__(self: 'Profiler',
+                 profile_rate: Optional[float] = None,
+                 threshold: Optional[float] = None,
+                 dump_path: Optional[str] = None,
+                 dump_every: int = 100):
+        self.profile_rate = profile_rate if profile_rate is not None else (1.0 if threshold is not None else 0.0)
+        self.threshold = threshold
+        self.dump_path = dump_path
+        self.dump_every = dump_every
+        self.profiled_requests = 0
+        self._layers: Dict[str, LayerStats] = dict()
+        self._layers_lock = Lock()
+        self._profile_stats: Optional[pstats.Stats] = None
+        self._profile_lock = Lock()
+        # cProfile can only be enabled once at a time in a process
+        self._profiling = Lock()
+
+    def instrument(self: 'Profiler',
+                   layers: Sequence[Middleware],
+                   handler: RequestHandler,
+                   scope: str = '',
+                   profile: bool = False) -> MiddlewareChain:
+        prefix = scope + ' ' if scope else ''
+        timed_layers: List[Middleware] = [self.profile_request] if profile else []
+        timed_layers.extend(self.time_layer(layer, prefix + layer_name(layer)) for layer in layers)
+        return MiddlewareChain(timed_layers, self.time_handler(handler, prefix + layer_name(handler)))
+
+    def time_layer(self: 'Profiler', layer: Middleware, name: str) -> Middleware:
+        def timed_layer(request: Request, response: Response, next_layer: NextFunction):
+            downstream = 0.0
+
+            def timed_next_layer():
+                nonlocal downstream
+                started_at = time.perf_counter()
+                try:
+                    return next_layer()
+                finally:
+                    downstream += time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            try:
+                return layer(request, response, timed_next_layer)
+            finally:
+                self.record(name, time.perf_counter() - started_at - downstream)
+
+        timed_layer.__qualname__ = name
+        return timed_layer
+
+    def time_handler(self: 'Profiler', handler: RequestHandler, name: str) -> RequestHandler:
+        def timed_handler(request: Request, response: Response):
+            started_at = time.perf_counter()
+            try:
+                return handler(request, response)
+            finally:
+                self.record(name, time.perf_counter() - started_at)
+
+        timed_handler.__qualname__ = name
+        return timed_handler
+
+    def record(self: 'Profiler', name: str, duration: float):
+        with self._layers_lock:
+            stats = self._layers.get(name)
+            if stats is None:
+                stats = self._layers[name] = LayerStats()
+            stats.calls += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+
+    def profile_request(self: 'Profiler', request: Request, response: Response, next_layer: NextFunction):
+        if self.profile_rate <= 0 or random.random() >= self.profile_rate or not self._profiling.acquire(blocking=False):
+            return next_layer()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler or tracing tool owns the process
+            self._profiling.release()
+            return next_layer()
+        started_at = time.perf_counter()
+        try:
+            return next_layer()
+        finally:
+            profile.disable()
+            self._profiling.release()
+            if self.threshold is None or time.perf_counter() - started_at >= self.threshold:
+                self.add_profile(profile)
+
+    def add_profile(self: 'Profiler', profile: cProfile.Profile):
+        with self._profile_lock:
+            if self._profile_stats is None:
+                self._profile_stats = pstats.Stats(profile)
+            else:
+                self._profile_stats.add(profile)
+            self.profiled_requests += 1
+            if self.dump_path is not None and self.profiled_requests % self.dump_every == 0:
+                self._profile_stats.dump_stats(self.dump_path)
+
+    def dump(self: 'Profiler', path: Optional[str] = None) -> bool:
+        path = path or self.dump_path
+        with self._profile_lock:
+            if path is None or self._profile_stats is None:
+                return False
+            self._profile_stats.dump_stats(path)
+            return True
+
+    def layer_stats(self: 'Profiler') -> Dict[str, Dict[str, float]]:
+        with self._layers_lock:
+            return {
+                name: {
+                    "calls": stats.calls,
+                    "total_ms": stats.total * 1000,
+                    "mean_ms": stats.total * 1000 / stats.calls,
+                    "max_ms": stats.max * 1000,
+                }
+                for name, stats in self._layers.items()
+            }
+
+    def reset(self: 'Profiler'):
+        with self._layers_lock:
+            self._layers.clear()
+        with self._profile_lock:
+            self._profile_stats = None
+            self.profiled_requests = 0
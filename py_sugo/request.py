@@ -1,102 +1,256 @@
 # Standard libs imports
-import random
+import io
+import os
+import shutil
+import itertools
+import tempfile
 from io import BufferedReader
-from string import digits, capwords, octdigits, ascii_lowercase, ascii_uppercase
-from typing import Any, Dict, List, cast
+from string import capwords
+from typing import IO, Any, Dict, Union, Iterator, Optional, cast
 from urllib.parse import parse_qs
-from wsgiref.headers import Headers
 
 # First party libs imports
-from py_sugo.core import CONTENT_LENGTH
-
-HTTP_HEADERS: List[str] = [
-    "A_IM",
-    "ACCEPT",
-    "ACCEPT_CHARSET",
-    "ACCEPT_DATETIME",
-    "ACCEPT_ENCODING",
-    "ACCEPT_LANGUAGE",
-    "ACCESS_CONTROL_REQUEST_METHOD",
-    "ACCESS_CONTROL_REQUEST_HEADERS",
-    "AUTHORIZATION",
-    "CACHE_CONTROL",
-    "CONNECTION",
-    "CONTENT_LENGTH",
-    "CONTENT_MD5",
-    "CONTENT_TYPE",
-    "COOKIE",
-    "DATE",
-    "EXPECT",
-    "FORWARDED",
-    "FROM",
-    "HOST",
-    "HTTP2_SETTINGS",
-    "IF_MATCH",
-    "IF_MODIFIED_SINCE",
-    "IF_NONE_MATCH",
-    "IF_RANGE",
-    "IF_UNMODIFIED_SINCE",
-    "MAX_FORWARDS",
-    "ORIGIN",
-    "PRAGMA",
-    "PROXY_AUTHORIZATION",
-    "RANGE",
-    "REFERER",
-    "TE",
-    "USER_AGENT",
-    "UPGRADE",
-    "VIA",
-    "WARNING",
-]
-
-chars: str = ascii_lowercase + ascii_uppercase + digits + octdigits
+from py_sugo.headers import HeaderMap
 
+# Environ keys that carry request headers without the HTTP_ prefix
+UNPREFIXED_HEADERS: Dict[str, str] = {"CONTENT_TYPE": 'Content-Type', "CONTENT_LENGTH": 'Content-Length'}
 
+MAX_REQUEST_ID_LENGTH: int = 200
+BODY_CHUNK_SIZE: int = 64 * 1024
+SPOOL_THRESHOLD: int = 1024 * 1024
+
+
+class RequestEntityTooLargeException(Exception):
+    message: str
+    max_body_size: int
+    status_code: int = 413
+
+    def __init__(self, max_body_size: int):
+        super(RequestEntityTooLargeException, self).__init__(max_body_size)
+        self.max_body_size = max_body_size
+        self.message = "Request body larger than %d bytes" % max_body_size
+
+
+class BodyReader(io.RawIOBase):
+    def __init__(self: 'BodyReader', wsgi_input: IO[bytes], content_length: Optional[int], chunked: bool, max_body_size: Optional[int]):
+        super().__init__()
+        self._input = wsgi_input
+        self._chunked = chunked
+        self._remaining = 0 if chunked else (content_length or 0)
+        self._finished = False
+        self._max_body_size = max_body_size
+        self._read_size = 0
+
+    def readable(self: 'BodyReader') -> bool:
+        return True
+
+    def readinto(self: 'BodyReader', buffer: Any) -> int:
+        if self._remaining == 0 and (not self._chunked or not self._next_chunk()):
+            return 0
+        data = self._input.read(min(len(buffer), self._remaining))
+        size = len(data)
+        if size == 0:
+            self._remaining = 0
+            self._finished = True
+            return 0
+        buffer[:size] = data
+        self._remaining -= size
+        self._read_size += size
+        if self._max_body_size is not None and self._read_size > self._max_body_size:
+            raise RequestEntityTooLargeException(self._max_body_size)
+        if self._chunked and self._remaining == 0:
+            self._input.readline()
+        return size
+
+    def _next_chunk(self: 'BodyReader') -> bool:
+        if self._finished:
+            return False
+        size_line = self._input.readline()
+        try:
+            self._remaining = int(size_line.split(b';', 1)[0], 16)
+        except ValueError:
+            self._remaining = 0
+        if self._remaining == 0:
+            # Skips the trailers up to the blank line that ends the body
+            while self._input.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            self._finished = True
+            return False
+        return True
+
+
+# The prefix is renewed in forked children, pre-forked workers never hand out the same ids
+class RequestIdGenerator:
+    prefix: str
+
+    def __init__(self: 'RequestIdGenerator'):
+        self.reset()
+
+    def reset(self: 'RequestIdGenerator'):
+        self.prefix = os.urandom(6).hex()
+        self._counter = itertools.count(1)
+
+    def __call__(self: 'RequestIdGenerator') -> str:
+        return '%s-%x' % (self.prefix, next(self._counter))
+
+
+next_request_id = RequestIdGenerator()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=next_request_id.reset)
+
+
+# Only the method and path are read eagerly, everything else the first time it is used
 class Request:
-    id: str
+    __slots__ = ('environ', 'path', 'method', 'params', 'route', 'max_body_size', 'spool_threshold', '_id', '_query', '_headers',
+                 '_body', '_raw_body', '_body_file', '_stream')
     environ: dict
-    wsgi_input: BufferedReader
     path: str
     method: str
-    port: str
-    host: str
-    protocol: str
-    server_name: str
-    query: dict
-    headers: Headers
-    body: Dict
-    raw_body: bytes
     params: Dict[str, Any]
+    # Url pattern of the matched route, set by the router
+    route: Optional[str]
+    max_body_size: Optional[int]
+    spool_threshold: int
 
-    def __init__(self, environ: dict):
-        self.id = ''.join(random.choice(chars) for i in range(30))
-        self.body = dict()
+    def __init__(self, environ: dict, max_body_size: Optional[int] = None, spool_threshold: int = SPOOL_THRESHOLD):
         self.environ = environ
-        self.wsgi_input: BufferedReader = cast(BufferedReader, environ.get('wsgi.input'))
         self.path = environ.get('PATH_INFO', '')
         self.method = environ.get('REQUEST_METHOD', '')
-        self.port = environ.get('PORT', '')
-        self.host = environ.get('HTTP_HOST', '')
-        self.protocol = environ.get('HTTP_PROTOCOL', '')
-        self.server_name = environ.get('SERVER_NAME', '')
-        self.query = parse_qs(environ.get('QUERY_STRING', ''))
         self.params = dict()
-        self.headers = Headers()
-        self._parse_http_headers()
-        self._read_request_body()
+        self.route = None
+        self.max_body_size = max_body_size
+        self.spool_threshold = spool_threshold
+        self._id: Optional[str] = None
+        self._query: Optional[dict] = None
+        self._headers: Optional[HeaderMap] = None
+        self._body: Optional[Dict] = None
+        self._raw_body: Optional[bytes] = None
+        self._body_file: Optional[IO[bytes]] = None
+        self._stream: Optional[IO[bytes]] = None
+
+    @property
+    def id(self) -> str:
+        if self._id is None:
+            incoming_id = self.environ.get('HTTP_X_REQUEST_ID')
+            self._id = incoming_id if incoming_id and len(incoming_id) <= MAX_REQUEST_ID_LENGTH else next_request_id()
+        return self._id
+
+    @property
+    def wsgi_input(self) -> BufferedReader:
+        return cast(BufferedReader, self.environ.get('wsgi.input'))
+
+    @property
+    def port(self) -> str:
+        return self.environ.get('PORT', '')
+
+    @property
+    def host(self) -> str:
+        return self.environ.get('HTTP_HOST', '')
+
+    @property
+    def protocol(self) -> str:
+        return self.environ.get('HTTP_PROTOCOL', '')
+
+    @property
+    def server_name(self) -> str:
+        return self.environ.get('SERVER_NAME', '')
+
+    @property
+    def query(self) -> dict:
+        if self._query is None:
+            self._query = parse_qs(self.environ.get('QUERY_STRING', ''))
+        return self._query
+
+    @query.setter
+    def query(self, query: dict):
+        self._query = query
 
-    def _parse_http_headers(self: 'Request'):
-        for key in self.environ.keys():
-            replaced_key: str = key.replace('HTTP_', '')
-            value = self.environ.get(key)
+    @property
+    def headers(self) -> HeaderMap:
+        if self._headers is None:
+            self._headers = self._parse_http_headers()
+        return self._headers
 
-            if replaced_key in HTTP_HEADERS:
-                final_key: str = capwords(replaced_key, '_').replace('_', '-')
-                self.headers.add_header(final_key, value)
+    @property
+    def body(self) -> Dict:
+        if self._body is None:
+            self._body = dict()
+        return self._body
 
-    def _read_request_body(self: 'Request'):
+    @body.setter
+    def body(self, body: Dict):
+        self._body = body
+
+    @property
+    def content_length(self) -> Optional[int]:
+        if self.is_chunked:
+            return None
         try:
-            request_body_size = int(self.headers.get(CONTENT_LENGTH, '0'))
+            return max(int(self.environ.get('CONTENT_LENGTH') or '0'), 0)
         except ValueError:
-            request_body_size = 0
-        self.raw_body = self.wsgi_input.read(request_body_size)
+            return 0
+
+    @property
+    def is_chunked(self) -> bool:
+        return 'chunked' in self.environ.get('HTTP_TRANSFER_ENCODING', '').lower()
+
+    def exceeds_max_body_size(self) -> bool:
+        content_length = self.content_length
+        return self.max_body_size is not None and content_length is not None and content_length > self.max_body_size
+
+    @property
+    def raw_body(self) -> bytes:
+        if self._raw_body is None:
+            if self._body_file is not None:
+                # The file may have been read already, by cgi.FieldStorage for instance
+                position = self._body_file.tell()
+                self._body_file.seek(0)
+                self._raw_body = self._body_file.read()
+                self._body_file.seek(position)
+            else:
+                self._raw_body = self._read_stream().read() or b''
+        return self._raw_body
+
+    # Kept in memory up to spool_threshold bytes, spilled to a temporary file above it
+    @property
+    def body_file(self) -> IO[bytes]:
+        if self._body_file is None:
+            body_file = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+            if self._raw_body is not None:
+                body_file.write(self._raw_body)
+            else:
+                shutil.copyfileobj(self._read_stream(), body_file, BODY_CHUNK_SIZE)
+            body_file.seek(0)
+            self._body_file = self._stream = cast(IO[bytes], body_file)
+        return self._body_file
+
+    def iter_body(self, chunk_size: int = BODY_CHUNK_SIZE) -> Iterator[bytes]:
+        stream = self._read_stream()
+        chunk = stream.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = stream.read(chunk_size)
+
+    def readinto(self, buffer: Union[bytearray, memoryview]) -> int:
+        return cast(io.RawIOBase, self._read_stream()).readinto(buffer) or 0
+
+    def _read_stream(self) -> IO[bytes]:
+        # The client stream can only be consumed once, later readers get whatever copy of the body was kept
+        if self._stream is None:
+            if self._body_file is not None:
+                self._stream = self._body_file
+            elif self._raw_body is not None:
+                self._stream = io.BytesIO(self._raw_body)
+            else:
+                reader = BodyReader(self.wsgi_input, self.content_length, self.is_chunked, self.max_body_size)
+                self._stream = cast(IO[bytes], reader)
+        return self._stream
+
+    def _parse_http_headers(self: 'Request') -> HeaderMap:
+        headers = HeaderMap()
+        for key, value in self.environ.items():
+            if key.startswith('HTTP_'):
+                headers.add_header(capwords(key[5:], '_').replace('_', '-'), value)
+            elif key in UNPREFIXED_HEADERS and value:
+                headers.add_header(UNPREFIXED_HEADERS[key], value)
+        return headers
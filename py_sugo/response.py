@@ -1,45 +1,222 @@
 # Standard libs imports
+import os
 import json
+import uuid
+import datetime
+import mimetypes
+import dataclasses
 from http import HTTPStatus
-from typing import Dict
-from wsgiref.headers import Headers
+from typing import IO, Any, Dict, List, Iterable, Iterator, Optional, cast
+from decimal import Decimal
 
 # First party libs imports
-from py_sugo.core import CONTENT_TYPE, CONTENT_LENGTH, UTF_8
+from py_sugo.core import GET, HEAD, UTF_8, CONTENT_TYPE, CONTENT_LENGTH
+from py_sugo.headers import HeaderMap, format_etag, etag_matches
 from py_sugo.request import Request
+from py_sugo.connections import FileWrapper, status_allows_body
 
+FILE_BLOCK_SIZE: int = 64 * 1024
+JSON_CHUNK_SIZE: int = 64 * 1024
 
+
+# Decimals are sent as strings unless decimal_as_float is set, so no precision is lost
+class SuGoJSONEncoder(json.JSONEncoder):
+    decimal_as_float: bool
+
+    def __init__(self: 'SuGoJSONEncoder', *args: Any, decimal_as_float: bool = False, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.decimal_as_float = decimal_as_float
+
+    def default(self: 'SuGoJSONEncoder', value: Any) -> Any:
+        if isinstance(value, Decimal):
+            return float(value) if self.decimal_as_float else str(value)
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return dataclasses.asdict(value)
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        if isinstance(value, (set, frozenset)):
+            return list(value)
+        return super().default(value)
+
+
+JSON_ENCODER: json.JSONEncoder = SuGoJSONEncoder()
+
+
+def iter_json_chunks(items: Iterable[Any], encoder: json.JSONEncoder, ndjson: bool = False, chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[bytes]:
+    # Only the item being encoded and the pending chunk are held in memory
+    pending: List[str] = [] if ndjson else ['[']
+    pending_size = 0
+    separator = '\n' if ndjson else ','
+    first = True
+    for item in items:
+        if not first and not ndjson:
+            pending.append(separator)
+        first = False
+        for piece in encoder.iterencode(item):
+            pending.append(piece)
+            pending_size += len(piece)
+        if ndjson:
+            pending.append(separator)
+        if pending_size >= chunk_size:
+            yield ''.join(pending).encode(UTF_8)
+            pending.clear()
+            pending_size = 0
+    if not ndjson:
+        pending.append(']')
+    if pending:
+        yield ''.join(pending).encode(UTF_8)
+
+
+def iter_file_range(file: IO[bytes], length: int, block_size: int = FILE_BLOCK_SIZE) -> Iterator[bytes]:
+    try:
+        while length > 0:
+            block = file.read(min(block_size, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+    finally:
+        file.close()
+
+
+class ResponseAlreadySentException(Exception):
+    message: str
+    status_code: int = 500
+
+    def __init__(self: 'ResponseAlreadySentException', request_id: str):
+        super(ResponseAlreadySentException, self).__init__(request_id)
+        self.message = "The response of request '%s' was already sent" % request_id
+
+
+STATUS_LINES: Dict[int, str] = {status.value: '%d %s' % (status.value, status.phrase) for status in HTTPStatus}
+
+
+def register_status(status_code: int, phrase: str):
+    STATUS_LINES[status_code] = '%d %s' % (status_code, phrase)
+
+
+# Sending only records the body, the server gets the status and headers from commit once the chain returned
 class Response:
-    id: str
-    headers: Headers
+    __slots__ = ('request', 'headers', 'status_code', 'body', 'iterable', 'file', 'file_length', 'sent', '_start_response')
+    json_encoder: json.JSONEncoder = JSON_ENCODER
+    headers: HeaderMap
     request: Request
     status_code: int
     body: bytes
+    iterable: Optional[Iterable[bytes]]
+    file: Optional[IO[bytes]]
+    file_length: int
+    sent: bool
 
     def __init__(self: 'Response', start_response, request: Request):
         self.request = request
-        self.id = request.id
         self._start_response = start_response
-        self.headers = Headers()
+        self.headers = HeaderMap()
         self.status_code = 200
+        self.body = b''
+        self.iterable = None
+        self.file = None
+        self.file_length = 0
+        self.sent = False
+
+    @property
+    def id(self: 'Response') -> str:
+        return self.request.id
 
     def status(self: 'Response', status_code: int) -> 'Response':
         self.status_code = status_code
         return self
 
-    def json(self: 'Response', data: Dict):
-        self.headers.add_header(CONTENT_TYPE, 'application/json')
-        return self.send(json.dumps(data).encode(UTF_8))
+    def etag(self: 'Response', value: str, weak: bool = False) -> bool:
+        # True, with a bodyless 304 already sent, when the client's copy is fresh
+        etag = format_etag(value, weak)
+        self.headers['ETag'] = etag
+        if_none_match = self.request.headers.get('If-None-Match')
+        if if_none_match is None or self.request.method not in (GET, HEAD) or not etag_matches(if_none_match, etag):
+            return False
+        self.status(304).send(b'')
+        return True
+
+    def json(self: 'Response', data: Any):
+        self.headers[CONTENT_TYPE] = 'application/json'
+        return self.send(self.json_encoder.encode(data).encode(UTF_8))
+
+    def json_stream(self: 'Response', items: Iterable[Any], ndjson: bool = False, chunk_size: int = JSON_CHUNK_SIZE):
+        self.headers[CONTENT_TYPE] = 'application/x-ndjson' if ndjson else 'application/json'
+        self.stream(iter_json_chunks(items, self.json_encoder, ndjson, chunk_size))
 
     def send(self: 'Response', body: bytes):
+        self._mark_sent()
         self.body = body
-        self.headers.add_header(CONTENT_LENGTH, str(len(self.body)))
-        self._start_response(self._get_wsgi_http_status(self.status_code), self.headers.items())
-        return self.body
+        return body
+
+    def stream(self: 'Response', iterable: Iterable[bytes], content_length: Optional[int] = None):
+        # Without a content_length the server frames the body: chunked on keep-alive connections, closing it otherwise
+        self._mark_sent()
+        self.iterable = iterable
+        if content_length is not None:
+            self.headers[CONTENT_LENGTH] = str(content_length)
+
+    def send_file(self: 'Response', path: str, offset: int = 0, length: Optional[int] = None, content_type: Optional[str] = None):
+        self._mark_sent()
+        file = open(path, 'rb')
+        size = os.fstat(file.fileno()).st_size
+        self.file_length = max(min(size - offset, length if length is not None else size), 0)
+        file.seek(offset)
+        self.file = file
+        if content_type is None and CONTENT_TYPE not in self.headers:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type is not None:
+            self.headers[CONTENT_TYPE] = content_type
+        self.headers[CONTENT_LENGTH] = str(self.file_length)
+
+    def clear(self: 'Response', keep_headers: bool = False):
+        if self.file is not None:
+            self.file.close()
+        if not keep_headers:
+            self.headers = HeaderMap()
+        self.body = b''
+        self.iterable = None
+        self.file = None
+        self.file_length = 0
+        self.sent = False
+
+    def commit(self: 'Response', environ: Dict[str, Any]) -> Iterable[bytes]:
+        if self.file is not None or self.iterable is not None:
+            self._start_response(self._get_wsgi_http_status(self.status_code), self.headers.items())
+            return self._file_iterable(environ) if self.file is not None else cast(Iterable[bytes], self.iterable)
+        if CONTENT_LENGTH in self.headers:
+            del self.headers[CONTENT_LENGTH]
+        headers = self.headers.items()
+        if not status_allows_body(self.status_code):
+            self._start_response(self._get_wsgi_http_status(self.status_code), headers)
+            # An iterator rather than a list, wsgiref only adds a Content-Length to bodies it can take the len of
+            return iter([b''])
+        headers.append((CONTENT_LENGTH, str(len(self.body))))
+        self._start_response(self._get_wsgi_http_status(self.status_code), headers)
+        return [self.body]
+
+    def _mark_sent(self: 'Response'):
+        if self.sent:
+            raise ResponseAlreadySentException(self.request.id)
+        self.sent = True
+
+    def _file_iterable(self: 'Response', environ: Dict[str, Any]) -> Iterable[bytes]:
+        file = self.file
+        assert file is not None
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        # Our own wrapper sends any range with os.sendfile, other servers' wrappers always read up to the end of the file
+        if file_wrapper is FileWrapper:
+            return FileWrapper(file, FILE_BLOCK_SIZE, self.file_length)
+        if file_wrapper is not None and file.tell() + self.file_length >= os.fstat(file.fileno()).st_size:
+            return file_wrapper(file, FILE_BLOCK_SIZE)
+        return iter_file_range(file, self.file_length)
 
     @staticmethod
     def _get_wsgi_http_status(status_code: int) -> str:
-        for http_status in HTTPStatus:
-            if http_status.value == status_code:
-                return '%d %s' % (http_status.value, http_status.phrase)
-        raise ValueError("Unsupported HTTP Code: '%d'" % status_code)
+        status_line = STATUS_LINES.get(status_code)
+        if status_line is None:
+            raise ValueError("Unsupported HTTP Code: '%d'" % status_code)
+        return status_line
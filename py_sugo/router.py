@@ -1,20 +1,33 @@
 # Standard libs imports
 import re
-from typing import List, Union, Pattern
+import uuid
+from typing import Any, Set, Dict, List, Tuple, Union, Pattern, Callable, Optional, NamedTuple
+from threading import Lock
+from collections import OrderedDict
 
 # First party libs imports
-from py_sugo.core import GET, PUT, HEAD, POST, PATCH, DELETE, OPTIONS
+from py_sugo.core import GET, PUT, HEAD, POST, PATCH, DELETE, OPTIONS, CONTENT_TYPE
 from py_sugo.request import Request
 from py_sugo.response import Response
-from py_sugo.middleware import Middleware, RequestHandler
+from py_sugo.profiling import Profiler
+from py_sugo.middleware import Middleware, RequestHandler, MiddlewareChain
 
 Handler = Union[RequestHandler, Middleware]
 
+PARAMETER_REGEX: Pattern = re.compile(r'<(?:(?P<converter>[a-z_]+):)?(?P<name>[A-Za-z_][A-Za-z0-9_]*)>')
+# Characters that only make sense in a raw regex url pattern, '.' and '-' are common in static paths and stay literal
+REGEX_SPECIAL_CHARACTERS: Pattern = re.compile(r'[\\^$*+?()\[\]{}|]')
+
+
+NOT_FOUND_BODY: bytes = b'{"message": "Route not found", "status_code": 404}'
+METHOD_NOT_ALLOWED_BODY: bytes = b'{"message": "Method not allowed", "status_code": 405}'
+
 
 class RouteNotFoundException(Exception):
     message: str
     url: str
     method: str
+    status_code: int = 404
 
     def __init__(self, method: str, url: str):
         super(RouteNotFoundException, self).__init__(method, url)
@@ -23,6 +36,16 @@ class RouteNotFoundException(Exception):
         self.message = "Route not found: '%s' '%s' " % (method, url)
 
 
+class MethodNotAllowedException(RouteNotFoundException):
+    allowed_methods: List[str]
+    status_code: int = 405
+
+    def __init__(self, method: str, url: str, allowed_methods: List[str]):
+        super(MethodNotAllowedException, self).__init__(method, url)
+        self.allowed_methods = allowed_methods
+        self.message = "Method not allowed: '%s' '%s' " % (method, url)
+
+
 class RouteAlreadyExistsException(Exception):
     message: str
     url: str
@@ -35,48 +58,351 @@ class RouteAlreadyExistsException(Exception):
         self.message = "Already added '%s' '%s' route" % (method, url)
 
 
+class Converter:
+    regex: str
+    pattern: Pattern
+    to_python: Callable[[str], Any]
+    priority: int
+
+    def __init__(self: 'Converter', regex: str, to_python: Callable[[str], Any], priority: int):
+        self.regex = regex
+        self.pattern = re.compile(regex)
+        self.to_python = to_python
+        self.priority = priority
+
+
+CONVERTERS: Dict[str, Converter] = {
+    'int': Converter(r'[0-9]+', int, 0),
+    'uuid': Converter(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}', uuid.UUID, 0),
+    'str': Converter(r'[^/]+', str, 1),
+    'path': Converter(r'.+', str, 2),
+}
+PATH_CONVERTER: Converter = CONVERTERS['path']
+
+Segment = Union[str, Tuple[str, Converter]]
+
+
+def split_path(path: str) -> List[str]:
+    return path[1:].split('/') if path.startswith('/') else path.split('/')
+
+
+def is_regex_pattern(url_pattern: str) -> bool:
+    return REGEX_SPECIAL_CHARACTERS.search(PARAMETER_REGEX.sub('', url_pattern)) is not None
+
+
+def parse_url_pattern(url_pattern: str) -> Optional[List[Segment]]:
+    # None when the pattern has to be matched as a regex
+    if is_regex_pattern(url_pattern):
+        return None
+    segments: List[Segment] = list()
+    parts = split_path(url_pattern)
+    for index, part in enumerate(parts):
+        parameter = PARAMETER_REGEX.fullmatch(part)
+        if parameter is None:
+            if PARAMETER_REGEX.search(part):
+                return None
+            segments.append(part)
+            continue
+        converter = CONVERTERS[parameter.group('converter') or 'str']
+        if converter is PATH_CONVERTER and index != len(parts) - 1:
+            return None
+        segments.append((parameter.group('name'), converter))
+    return segments
+
+
+def match_segments(pattern: List[Segment], parts: List[str]) -> Optional[Dict[str, Any]]:
+    # Same rules as the route tree, so a route matched by the tree always matches on its own too
+    params: Dict[str, Any] = dict()
+    for index, segment in enumerate(pattern):
+        if index >= len(parts):
+            return None
+        if isinstance(segment, str):
+            if parts[index] != segment:
+                return None
+            continue
+        name, converter = segment
+        if converter is PATH_CONVERTER:
+            remainder = '/'.join(parts[index:])
+            if not remainder:
+                return None
+            params[name] = remainder
+            return params
+        if not converter.pattern.fullmatch(parts[index]):
+            return None
+        params[name] = converter.to_python(parts[index])
+    return params if len(parts) == len(pattern) else None
+
+
+def compile_url_pattern(url_pattern: str) -> Tuple[Pattern, Dict[str, Converter]]:
+    converters: Dict[str, Converter] = dict()
+    if is_regex_pattern(url_pattern):
+        return re.compile("^%s$" % url_pattern), converters
+
+    regex_parts: List[str] = list()
+    position = 0
+    for parameter in PARAMETER_REGEX.finditer(url_pattern):
+        converter = CONVERTERS[parameter.group('converter') or 'str']
+        converters[parameter.group('name')] = converter
+        regex_parts.append(re.escape(url_pattern[position:parameter.start()]))
+        regex_parts.append('(?P<%s>%s)' % (parameter.group('name'), converter.regex))
+        position = parameter.end()
+    regex_parts.append(re.escape(url_pattern[position:]))
+    return re.compile("^%s$" % ''.join(regex_parts)), converters
+
+
 class Route:
     url_pattern: str
     method: str
     layers: List[Handler] = list()
     regex: Pattern
-    current_layer: int = 0
+    converters: Dict[str, Converter]
+    segments: Optional[List[Segment]]
+    chain: MiddlewareChain
 
     def __init__(self: 'Route', method: str, url_pattern: str, first_handler: Handler, *handlers: Handler):
         self.url_pattern = url_pattern
         self.method = method
-        self.regex = re.compile("^%s$" % url_pattern)
+        self.regex, self.converters = compile_url_pattern(url_pattern)
+        self.segments = parse_url_pattern(url_pattern)
         route_handlers: List[Handler] = [first_handler]
         for handler in list(handlers):
             route_handlers.append(handler)
         self.layers = route_handlers
+        self.chain = MiddlewareChain(route_handlers[:-1], route_handlers[-1])
+
+    def match(self: 'Route', url: str) -> Optional[Dict[str, Any]]:
+        if self.segments is not None:
+            return match_segments(self.segments, split_path(url))
+        match = self.regex.match(url)
+        if match is None:
+            return None
+        params: Dict[str, Any] = match.groupdict()
+        for name, converter in self.converters.items():
+            params[name] = converter.to_python(params[name])
+        return params
+
+    def use_profiler(self: 'Route', profiler: Optional[Profiler]):
+        handlers = self.layers
+        if profiler is None:
+            self.chain = MiddlewareChain(handlers[:-1], handlers[-1])
+        else:
+            self.chain = profiler.instrument(handlers[:-1], handlers[-1], '%s %s' % (self.method, self.url_pattern))
 
     def handle(self, request: Request, response: Response):
-        self.current_layer: int = 0
-        match = self.regex.match(request.path)
-        assert match is not None
-        request.params = match.groupdict()
-
-        def next_layer():
-            layer = self.layers[self.current_layer]
-            self.current_layer += 1
-            if self.current_layer >= len(self.layers):
-                return layer(request, response)
+        params = self.match(request.path)
+        if params is None:
+            raise RouteNotFoundException(request.method, request.path)
+        request.params = params
+        return self.chain(request, response)
+
+
+class RouteMatch(NamedTuple):
+    route: Route
+    params: Dict[str, Any]
+    handler: RequestHandler
+    pattern: str
+
+
+class Mount:
+    prefix: str
+    router: 'Router'
+    middlewares: Tuple[Middleware, ...]
+
+    def __init__(self: 'Mount', prefix: str, router: 'Router', middlewares: Tuple[Middleware, ...]):
+        self.prefix = prefix.rstrip('/')
+        self.router = router
+        self.middlewares = middlewares
+        self.profiler: Optional[Profiler] = None
+        self._chains: Dict[RequestHandler, MiddlewareChain] = dict()
+
+    def match(self: 'Mount', method: str, segments: List[str], index: int) -> Optional[RouteMatch]:
+        match = self.router.match(method, '/' + '/'.join(segments[index:]))
+        if match is None:
+            return None
+        return RouteMatch(match.route, match.params, self._wrap(match.handler), self.prefix + match.pattern)
+
+    def allowed_methods(self: 'Mount', segments: List[str], index: int) -> Set[str]:
+        return self.router.allowed_methods('/' + '/'.join(segments[index:]))
+
+    def _wrap(self: 'Mount', handler: RequestHandler) -> RequestHandler:
+        # The mount middlewares are compiled around each sub route chain the first time it is matched
+        if not self.middlewares:
+            return handler
+        chain = self._chains.get(handler)
+        if chain is None:
+            if self.profiler is not None:
+                chain = self.profiler.instrument(self.middlewares, handler, 'mount ' + self.prefix)
             else:
-                return layer(request, response, next_layer)
+                chain = MiddlewareChain(self.middlewares, handler)
+            chain = self._chains.setdefault(handler, chain)
+        return chain
+
+    def use_profiler(self: 'Mount', profiler: Optional[Profiler]):
+        self.profiler = profiler
+        self._chains = dict()
+        self.router.use_profiler(profiler)
+
+
+class MountedRoute:
+    # What find_route returns for a route behind a mount: its own url pattern only matches the path left by the mount,
+    # so it is handled with the params and the mount middlewares of the match that found it
+    route: Route
+    url: str
+    match: RouteMatch
+
+    def __init__(self: 'MountedRoute', url: str, match: RouteMatch):
+        self.route = match.route
+        self.url = url
+        self.match = match
+
+    @property
+    def url_pattern(self: 'MountedRoute') -> str:
+        return self.route.url_pattern
+
+    @property
+    def method(self: 'MountedRoute') -> str:
+        return self.route.method
+
+    @property
+    def pattern(self: 'MountedRoute') -> str:
+        return self.match.pattern
+
+    def handle(self: 'MountedRoute', request: Request, response: Response):
+        if request.method != self.method or request.path != self.url:
+            raise RouteNotFoundException(request.method, request.path)
+        request.params = dict(self.match.params)
+        request.route = self.match.pattern
+        return self.match.handler(request, response)
+
+
+class RouteNode:
+    static: Dict[str, 'RouteNode']
+    parameters: List[Tuple[str, Converter, 'RouteNode']]
+    routes: Dict[str, Route]
+    mounts: List[Mount]
+
+    def __init__(self: 'RouteNode'):
+        self.static = dict()
+        self.parameters = list()
+        self.routes = dict()
+        self.mounts = list()
+
+    def insert(self: 'RouteNode', segments: List[Segment], route: Route):
+        node = self
+        for segment in segments:
+            node = node._child(segment)
+        node.routes[route.method] = route
 
-        return next_layer()
+    def insert_mount(self: 'RouteNode', segments: List[Segment], mount: Mount):
+        node = self
+        for segment in segments:
+            node = node._child(segment)
+        node.mounts.append(mount)
+
+    def _child(self: 'RouteNode', segment: Segment) -> 'RouteNode':
+        if isinstance(segment, str):
+            return self.static.setdefault(segment, RouteNode())
+        name, converter = segment
+        for parameter_name, parameter_converter, child in self.parameters:
+            if parameter_name == name and parameter_converter is converter:
+                return child
+        child = RouteNode()
+        self.parameters.append((name, converter, child))
+        # Static children are always tried first, among parameters the most specific converters go first
+        self.parameters.sort(key=lambda parameter: parameter[1].priority)
+        return child
+
+    def search(self: 'RouteNode', method: str, segments: List[str], index: int, params: Dict[str, Any]) -> Optional[RouteMatch]:
+        if index == len(segments):
+            route = self.routes.get(method)
+            if route is not None:
+                return RouteMatch(route, params, route.chain, route.url_pattern)
+        else:
+            match = self._search_children(method, segments, index, params)
+            if match is not None:
+                return match
+        # Sub routers are only reached once their whole prefix matched, the rest of the tree never looks at them
+        for mount in self.mounts:
+            match = mount.match(method, segments, index)
+            if match is not None:
+                match.params.update(params)
+                return match
+        return None
+
+    def collect_methods(self: 'RouteNode', segments: List[str], index: int, methods: Set[str]):
+        if index == len(segments):
+            methods.update(self.routes)
+        else:
+            segment = segments[index]
+            child = self.static.get(segment)
+            if child is not None:
+                child.collect_methods(segments, index + 1, methods)
+            for _, converter, child in self.parameters:
+                if converter is PATH_CONVERTER:
+                    if '/'.join(segments[index:]):
+                        methods.update(child.routes)
+                elif converter.pattern.fullmatch(segment):
+                    child.collect_methods(segments, index + 1, methods)
+        for mount in self.mounts:
+            methods.update(mount.allowed_methods(segments, index))
+
+    def _search_children(self: 'RouteNode', method: str, segments: List[str], index: int, params: Dict[str, Any]) -> Optional[RouteMatch]:
+        segment = segments[index]
+        child = self.static.get(segment)
+        if child is not None:
+            match = child.search(method, segments, index + 1, params)
+            if match is not None:
+                return match
+        for name, converter, child in self.parameters:
+            if converter is PATH_CONVERTER:
+                route = child.routes.get(method)
+                remainder = '/'.join(segments[index:])
+                if route is not None and remainder:
+                    params[name] = remainder
+                    return RouteMatch(route, params, route.chain, route.url_pattern)
+            elif converter.pattern.fullmatch(segment):
+                match = child.search(method, segments, index + 1, params)
+                if match is not None:
+                    params[name] = converter.to_python(segment)
+                    return match
+        return None
+
+
+class RouteMiss(NamedTuple):
+    status_code: int
+    allow: str
+    body: bytes
 
 
 class Router:
-    routes: List[Route] = list()
+    routes: List[Route]
+    mounts: List[Mount]
+    tree: RouteNode
+    regex_routes: Dict[str, List[Route]]
+    miss_cache_size: int
+
+    def __init__(self: 'Router', miss_cache_size: int = 1024):
+        self.routes = list()
+        self.mounts = list()
+        self.tree = RouteNode()
+        self.regex_routes = dict()
+        self.miss_cache_size = miss_cache_size
+        self._route_index: Dict[Tuple[str, str], Route] = dict()
+        self._parents: List['Router'] = list()
+        self._misses: 'OrderedDict[Tuple[str, str], RouteMiss]' = OrderedDict()
+        self._misses_lock = Lock()
 
     def add_route(self: 'Router', method: str, url_pattern: str, first_handler: Handler, *handlers: Handler) -> 'Router':
-        matches = [r for r in self.routes if r.method == method and r.url_pattern == url_pattern]
-        if matches:
+        if (method, url_pattern) in self._route_index:
             raise RouteAlreadyExistsException(method, url_pattern)
         route = Route(method, url_pattern, first_handler, *handlers)
+        if route.segments is None:
+            self.regex_routes.setdefault(method, list()).append(route)
+        else:
+            self.tree.insert(route.segments, route)
+        self._route_index[(method, url_pattern)] = route
         self.routes.append(route)
+        self.clear_miss_cache()
         return self
 
     def get(self: 'Router', url_pattern: str, first_handler: Handler, *handlers: Handler) -> 'Router':
@@ -100,10 +426,85 @@ class Router:
     def options(self: 'Router', url_pattern: str, first_handler: Handler, *handlers: Handler) -> 'Router':
         return self.add_route(OPTIONS, url_pattern, first_handler, *handlers)
 
-    def find_route(self: 'Router', method: str, url: str) -> Route:
-        # We make a search by method first to limit the choices for the regex filter, that is more resource consuming
-        method_matched_routes = [r for r in self.routes if r.method == method]
-        matches = [r for r in method_matched_routes if r.regex.match(url)]
-        if not matches:
+    def mount(self: 'Router', prefix: str, router: 'Router', *middlewares: Middleware) -> 'Router':
+        # A root mount hangs from the tree itself, it is tried once nothing else in the tree matched
+        segments = parse_url_pattern(prefix.rstrip('/')) if prefix.strip('/') else []
+        if segments is None or not all(isinstance(segment, str) for segment in segments):
+            raise ValueError("Mount prefixes must be static paths: '%s'" % prefix)
+        mount = Mount(prefix, router, middlewares)
+        self.tree.insert_mount(segments, mount)
+        self.mounts.append(mount)
+        router._parents.append(self)
+        self.clear_miss_cache()
+        return self
+
+    def use_profiler(self: 'Router', profiler: Optional[Profiler]):
+        for route in self.routes:
+            route.use_profiler(profiler)
+        for mount in self.mounts:
+            mount.use_profiler(profiler)
+
+    def clear_miss_cache(self: 'Router'):
+        with self._misses_lock:
+            self._misses.clear()
+        for parent in self._parents:
+            parent.clear_miss_cache()
+
+    def allowed_methods(self: 'Router', url: str) -> Set[str]:
+        methods: Set[str] = set()
+        self.tree.collect_methods(split_path(url), 0, methods)
+        for method, routes in self.regex_routes.items():
+            if method not in methods and any(route.regex.match(url) for route in routes):
+                methods.add(method)
+        return methods
+
+    def match(self: 'Router', method: str, url: str) -> Optional[RouteMatch]:
+        # The tree costs one dict lookup per path segment, the raw regex routes are only tried when it has no answer
+        match = self.tree.search(method, split_path(url), 0, dict())
+        if match is not None:
+            return match
+        for route in self.regex_routes.get(method, ()):
+            params = route.match(url)
+            if params is not None:
+                return RouteMatch(route, params, route.chain, route.url_pattern)
+        return None
+
+    def find_route(self: 'Router', method: str, url: str) -> Union[Route, MountedRoute]:
+        miss = self._misses.get((method, url))
+        match = self.match(method, url) if miss is None else None
+        if match is None:
+            miss = miss or self._remember_miss(method, url)
+            if miss.status_code == 405:
+                raise MethodNotAllowedException(method, url, miss.allow.split(', '))
             raise RouteNotFoundException(method, url)
-        return matches.pop()
+        if match.handler is match.route.chain and match.pattern == match.route.url_pattern:
+            return match.route
+        return MountedRoute(url, match)
+
+    def handle(self: 'Router', request: Request, response: Response):
+        # Known misses are answered from the cache, unknown paths never go through the exception machinery
+        miss = self._misses.get((request.method, request.path))
+        if miss is None:
+            match = self.match(request.method, request.path)
+            if match is not None:
+                request.params = match.params
+                request.route = match.pattern
+                return match.handler(request, response)
+            miss = self._remember_miss(request.method, request.path)
+        response.status(miss.status_code)
+        response.headers.add_header(CONTENT_TYPE, 'application/json')
+        if miss.allow:
+            response.headers.add_header('Allow', miss.allow)
+        return response.send(miss.body)
+
+    def _remember_miss(self: 'Router', method: str, url: str) -> RouteMiss:
+        allowed_methods = self.allowed_methods(url)
+        if allowed_methods:
+            miss = RouteMiss(405, ', '.join(sorted(allowed_methods)), METHOD_NOT_ALLOWED_BODY)
+        else:
+            miss = RouteMiss(404, '', NOT_FOUND_BODY)
+        with self._misses_lock:
+            self._misses[(method, url)] = miss
+            while len(self._misses) > self.miss_cache_size:
+                self._misses.popitem(last=False)
+        return miss
@@ -1,6 +1,310 @@
 # Standard libs imports
+import os
+import time
+import queue
+import signal
+from socket import socket
+from typing import Any, Set, Dict, List, Tuple, Callable, Optional
+from threading import Lock, Event, Thread
 from wsgiref.simple_server import WSGIServer
 
+# First party libs imports
+from py_sugo.request import SPOOL_THRESHOLD
+from py_sugo.middleware import logger
+from py_sugo.connections import ConnectionManager
+
+SERVICE_UNAVAILABLE: bytes = b'HTTP/1.0 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+Job = Callable[..., Any]
+
+DEFAULT_BACKLOG: int = 64
+
+
+class WorkerPool:
+    workers: int
+    backlog: int
+    busy_workers: int
+
+    def __init__(self: 'WorkerPool', workers: int, backlog: int):
+        self.workers = workers
+        self.backlog = backlog
+        self.busy_workers = 0
+        self._jobs: queue.Queue = queue.Queue(maxsize=backlog)
+        self._threads: List[Thread] = list()
+        self._lock = Lock()
+
+    @property
+    def queue_depth(self: 'WorkerPool') -> int:
+        return self._jobs.qsize()
+
+    def start(self: 'WorkerPool'):
+        # Threads are started lazily so a pool created before a fork is only populated in the process that serves
+        if self._threads:
+            return
+        for number in range(self.workers):
+            thread = Thread(target=self._work, name='py-sugo-worker-%d' % number, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self: 'WorkerPool', job: Job, *args: Any) -> bool:
+        try:
+            self._jobs.put_nowait((job, args))
+        except queue.Full:
+            return False
+        return True
+
+    def stop(self: 'WorkerPool', timeout: Optional[float] = None) -> bool:
+        # The sentinels go to the back of the queue, so the jobs already accepted are still served. Workers still busy
+        # after the timeout are abandoned, they are daemon threads and won't keep the process alive
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            for _ in self._threads:
+                self._jobs.put((None, ()), timeout=self._remaining(deadline))
+        except queue.Full:
+            pass
+        for thread in self._threads:
+            thread.join(self._remaining(deadline))
+        stopped = not any(thread.is_alive() for thread in self._threads)
+        self._threads = list()
+        return stopped
+
+    def drop_pending(self: 'WorkerPool') -> List[Tuple[Job, Tuple]]:
+        # Jobs still queued once the workers are gone would never run, they are handed back so their sockets can be closed
+        dropped = list()
+        while True:
+            try:
+                job, args = self._jobs.get_nowait()
+            except queue.Empty:
+                return dropped
+            if job is not None:
+                dropped.append((job, args))
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+    def _work(self: 'WorkerPool'):
+        while True:
+            job, args = self._jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                self.busy_workers += 1
+            try:
+                job(*args)
+            finally:
+                with self._lock:
+                    self.busy_workers -= 1
+
 
 class PySuGoServer(WSGIServer):
-    pass
+    worker_pool: Optional[WorkerPool] = None
+    connections: Optional[ConnectionManager] = None
+
+    def use_worker_pool(self: 'PySuGoServer', workers: int, backlog: int):
+        self.worker_pool = WorkerPool(workers, backlog)
+
+    def use_keep_alive(self: 'PySuGoServer',
+                       idle_timeout: float,
+                       max_requests: int,
+                       max_body_size: Optional[int] = None,
+                       spool_threshold: int = SPOOL_THRESHOLD):
+        # Requests must never run on the I/O thread, a single slow one would freeze every connection
+        if self.worker_pool is None:
+            self.use_worker_pool(min(32, (os.cpu_count() or 1) + 4), DEFAULT_BACKLOG)
+        self.connections = ConnectionManager(self.get_app(), self.base_environ, self._dispatch, idle_timeout, max_requests, max_body_size,
+                                             spool_threshold)
+
+    def stats(self: 'PySuGoServer') -> Dict[str, int]:
+        stats = {"workers": 0, "busy_workers": 0, "queue_depth": 0, "backlog": 0, "open_connections": 0}
+        if self.worker_pool is not None:
+            stats.update({
+                "workers": self.worker_pool.workers,
+                "busy_workers": self.worker_pool.busy_workers,
+                "queue_depth": self.worker_pool.queue_depth,
+                "backlog": self.worker_pool.backlog
+            })
+        if self.connections is not None:
+            stats['open_connections'] = self.connections.open_connections
+        return stats
+
+    def serve_forever(self: 'PySuGoServer', poll_interval: float = 0.5):
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+        if self.connections is not None:
+            self.connections.start()
+        super().serve_forever(poll_interval)
+
+    def process_request(self: 'PySuGoServer', request: socket, client_address: Tuple[str, int]):
+        if self.connections is not None:
+            return self.connections.add(request, client_address)
+        if self.worker_pool is None:
+            return super().process_request(request, client_address)
+        if not self.worker_pool.submit(self._process_request_in_worker, request, client_address):
+            self._reject_request(request)
+
+    def shutdown(self: 'PySuGoServer'):
+        # Draining starts right away, serve_forever may take a whole poll interval to notice the shutdown
+        if self.connections is not None:
+            self.connections.drain()
+        super().shutdown()
+
+    def server_close(self: 'PySuGoServer', timeout: Optional[float] = None):
+        # Connections stop first, so nothing is dispatched to the pool after its stop sentinels
+        super().server_close()
+        if self.connections is not None:
+            self.connections.stop()
+        if self.worker_pool is not None:
+            self.worker_pool.stop(timeout)
+            for job, args in self.worker_pool.drop_pending():
+                self._discard(job, *args)
+
+    def _dispatch(self: 'PySuGoServer', job: Job, *args: Any) -> bool:
+        return self.worker_pool.submit(job, *args)
+
+    def _discard(self: 'PySuGoServer', job: Job, *args: Any):
+        if job == self._process_request_in_worker:
+            self.shutdown_request(args[0])
+        else:
+            self.connections.discard(*args)
+
+    def _process_request_in_worker(self: 'PySuGoServer', request: socket, client_address: Tuple[str, int]):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def _reject_request(self: 'PySuGoServer', request: socket):
+        # The queue is full: answering right away is cheaper than letting the client wait on a connection nobody will read
+        try:
+            request.sendall(SERVICE_UNAVAILABLE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+
+class PreforkServer:
+    server: PySuGoServer
+    processes: int
+    children: Set[int]
+    shutdown_timeout: float = 30
+    # Children that die before min_child_uptime are respawned with an exponential backoff
+    min_child_uptime: float = 5.0
+    respawn_backoff: float = 0.5
+    max_respawn_backoff: float = 30
+
+    def __init__(self: 'PreforkServer',
+                 server: PySuGoServer,
+                 processes: int,
+                 on_child_start: Optional[Job] = None,
+                 on_child_stop: Optional[Job] = None):
+        self.server = server
+        self.processes = processes
+        self.on_child_start = on_child_start
+        self.on_child_stop = on_child_stop
+        self.children = set()
+        self._started_at: Dict[int, float] = dict()
+        self._quick_failures = 0
+        self._respawn_at = 0.0
+        self._stopping = Event()
+        self._is_shut_down = Event()
+        self._is_shut_down.set()
+
+    def stats(self: 'PreforkServer') -> Dict[str, int]:
+        return {"processes": self.processes, "alive_processes": len(self.children)}
+
+    def start(self: 'PreforkServer'):
+        # The first children are forked by the thread calling listen, before any helper thread of the master exists
+        while len(self.children) < self.processes:
+            self._spawn()
+
+    def serve_forever(self: 'PreforkServer', poll_interval: float = 0.5):
+        self._is_shut_down.clear()
+        try:
+            self.start()
+            while not self._stopping.wait(poll_interval):
+                self._respawn_dead_children()
+            self._terminate_children()
+        finally:
+            self._stopping.clear()
+            self._is_shut_down.set()
+
+    def shutdown(self: 'PreforkServer'):
+        self._stopping.set()
+        self._is_shut_down.wait()
+
+    def server_close(self: 'PreforkServer', timeout: Optional[float] = None):
+        self.server.server_close(timeout)
+
+    def _spawn(self: 'PreforkServer'):
+        # Respawns fork from the monitoring thread. The master runs no other threads, the startup hooks only run in the
+        # children, and the locks of the logging module are reinitialised in the child by os.fork itself
+        pid = os.fork()
+        if pid == 0:
+            self._serve_in_child()
+        self.children.add(pid)
+        self._started_at[pid] = time.monotonic()
+
+    def _serve_in_child(self: 'PreforkServer'):
+        # Every child accepts on the socket inherited from the master, the kernel spreads the connections among them
+        status = 0
+        try:
+            stop = Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            if self.on_child_start is not None:
+                self.on_child_start()
+            thread = Thread(target=self.server.serve_forever, daemon=True)
+            thread.start()
+            while not stop.wait(0.5):
+                if not thread.is_alive():
+                    # A child that no longer serves exits, so the master forks one that does
+                    logger.error("Serve loop of child %d died", os.getpid())
+                    status = 1
+                    break
+            if thread.is_alive():
+                self.server.shutdown()
+            self.server.server_close()
+            if self.on_child_stop is not None:
+                self.on_child_stop()
+        except BaseException:
+            logger.exception("Child %d failed", os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _respawn_dead_children(self: 'PreforkServer'):
+        for pid in list(self.children):
+            finished_pid, _ = os.waitpid(pid, os.WNOHANG)
+            if finished_pid != 0:
+                self.children.discard(pid)
+                self._child_exited(pid)
+        if len(self.children) < self.processes and time.monotonic() >= self._respawn_at:
+            self.start()
+
+    def _child_exited(self: 'PreforkServer', pid: int):
+        uptime = time.monotonic() - self._started_at.pop(pid, 0)
+        if uptime >= self.min_child_uptime:
+            self._quick_failures = 0
+            return
+        # Children dying right after the fork usually fail the same way every time, forking them in a loop would not help
+        self._quick_failures += 1
+        delay = min(self.respawn_backoff * 2 ** (self._quick_failures - 1), self.max_respawn_backoff)
+        self._respawn_at = time.monotonic() + delay
+        logger.warning("Child %d exited after %.1fs, respawning in %.1fs", pid, uptime, delay)
+
+    def _terminate_children(self: 'PreforkServer'):
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self.children:
+            for pid in list(self.children):
+                finished_pid, _ = os.waitpid(pid, os.WNOHANG)
+                if finished_pid != 0:
+                    self.children.discard(pid)
+                    self._started_at.pop(pid, None)
+                elif time.monotonic() > deadline:
+                    os.kill(pid, signal.SIGKILL)
+            time.sleep(0.05)
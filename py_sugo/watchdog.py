@@ -0,0 +1,139 @@
+# Standard libs imports
+import os
+import sys
+import time
+import threading
+import traceback
+from typing import Any, Dict, List, Callable, Optional
+from threading import Lock, Event, Thread
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import NextFunction, logger
+
+
+class InFlightRequest:
+    __slots__ = ('request', 'thread', 'started_at', 'reported')
+
+    def __init__(self: 'InFlightRequest', request: Request, thread: Thread):
+        self.request = request
+        self.thread = thread
+        self.started_at = time.monotonic()
+        self.reported = False
+
+    def age(self: 'InFlightRequest', now: Optional[float] = None) -> float:
+        return (now if now is not None else time.monotonic()) - self.started_at
+
+
+class SlowRequestReport:
+    __slots__ = ('request_id', 'method', 'path', 'route', 'age', 'thread_name', 'stack')
+
+    def __init__(self: 'SlowRequestReport', entry: InFlightRequest, age: float, stack: str):
+        self.request_id = entry.request.id
+        self.method = entry.request.method
+        self.path = entry.request.path
+        self.route = entry.request.route
+        self.age = age
+        self.thread_name = entry.thread.name
+        self.stack = stack
+
+    def to_dict(self: 'SlowRequestReport') -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+SlowRequestSink = Callable[[SlowRequestReport], Any]
+
+
+def log_slow_request(report: SlowRequestReport):
+    log_format: str = "Slow Request (%s): %s %s --> running for %.1fs on %s\n%s"
+    logger.warning(log_format, report.request_id, report.method, report.path, report.age, report.thread_name, report.stack)
+
+
+class Watchdog:
+    threshold: float
+    interval: float
+    sink: SlowRequestSink
+
+    def __init__(self: 'Watchdog', threshold: float = 10.0, interval: float = 1.0, sink: SlowRequestSink = log_slow_request):
+        self.threshold = threshold
+        self.interval = interval
+        self.sink = sink
+        self._in_flight: Dict[int, InFlightRequest] = dict()
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._pid = os.getpid()
+
+    def __call__(self: 'Watchdog', request: Request, response: Response, next_layer: NextFunction):
+        entry = InFlightRequest(request, threading.current_thread())
+        key = id(entry)
+        with self._lock:
+            self._in_flight[key] = entry
+        try:
+            return next_layer()
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def start(self: 'Watchdog'):
+        # A thread started before a fork doesn't exist in the child, it has to be started again there
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name='py-sugo-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self: 'Watchdog'):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        if self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+
+    def check(self: 'Watchdog') -> List[SlowRequestReport]:
+        now = time.monotonic()
+        with self._lock:
+            slow = [entry for entry in self._in_flight.values() if not entry.reported and entry.age(now) >= self.threshold]
+            for entry in slow:
+                entry.reported = True
+        if not slow:
+            return []
+        frames = sys._current_frames()
+        reports = list()
+        for entry in slow:
+            frame = frames.get(entry.thread.ident) if entry.thread.ident is not None else None
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+            report = SlowRequestReport(entry, entry.age(now), stack)
+            reports.append(report)
+            try:
+                self.sink(report)
+            except Exception:
+                logger.exception('Slow request sink failed')
+        return reports
+
+    def in_flight(self: 'Watchdog') -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entries = sorted(self._in_flight.values(), key=lambda entry: entry.started_at)
+        return [{
+            "id": entry.request.id,
+            "method": entry.request.method,
+            "path": entry.request.path,
+            "route": entry.request.route,
+            "age": round(entry.age(now), 3),
+            "thread": entry.thread.name,
+        } for entry in entries]
+
+    def handle(self: 'Watchdog', request: Request, response: Response):
+        return response.json({"in_flight": self.in_flight()})
+
+    def router(self: 'Watchdog', path: str = '/in-flight') -> Router:
+        return Router().get(path, self.handle)
+
+    def _run(self: 'Watchdog'):
+        while not self._stopped.wait(self.interval):
+            self.check()
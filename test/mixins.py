@@ -15,13 +15,20 @@ class ServerTestMixin:
     port: int = 50000
     application: Application
     middleware: List[Middleware] = list()
+    listen_kwargs: Dict[str, Any] = dict()
 
     @classmethod
     def setUpClass(cls) -> None:
         cls.application = Application(cls.get_request_handler())
         for middleware in cls.middleware:
             cls.application.use_middleware(middleware)
-        cls.application.listen(cls.host, cls.port, True)
+        cls.setup_application(cls.application)
+        cls.application.listen(cls.host, cls.port, True, **cls.listen_kwargs)
+
+    # Hook for the middlewares, watchdogs or profilers that have to be created along with the application
+    @classmethod
+    def setup_application(cls, application: Application):
+        pass
 
     @classmethod
     def tearDownClass(cls) -> None:
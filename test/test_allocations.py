@@ -0,0 +1,91 @@
+# Standard libs imports
+import json
+import unittest
+import tracemalloc
+from typing import List
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler
+from py_sugo.allocations import AllocationTracker
+from py_sugo.application import Application
+
+LEAKED: List[bytearray] = list()
+
+
+class AllocationTrackerTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50033
+    tracker: AllocationTracker
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def leak(request: Request, response: Response):
+            LEAKED.append(bytearray(256 * 1024))
+            return response.json({"leaked": len(LEAKED)})
+
+        def spike(request: Request, response: Response):
+            buffer = bytearray(512 * 1024)
+            return response.json({"size": len(buffer)})
+
+        router = Router()
+        router.get('/leak/<int:id>', leak)
+        router.get('/spike', spike)
+        cls.tracker = AllocationTracker(sample_rate=1.0, top_n=3)
+        router.mount('/debug', cls.tracker.router())
+        return router.handle
+
+    @classmethod
+    def setup_application(cls, application: Application):
+        application.use_middleware(cls.tracker)
+        application.on_startup(cls.tracker.start)
+        application.on_shutdown(cls.tracker.stop)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        LEAKED.clear()
+
+    def test_should_attribute_allocations_to_routes(self):
+        for path in ['/leak/1', '/leak/2', '/spike']:
+            self.http_request('GET', path, port=self.port).read()
+        response = self.http_request('GET', '/debug/allocations', port=self.port)
+        report = json.loads(response.read())
+        self.assertTrue(report['tracing'])
+        leak = report['routes']['/leak/<int:id>']
+        self.assertEqual(leak['samples'], 2)
+        self.assertGreaterEqual(leak['mean_net_bytes'], 256 * 1024)
+        self.assertLessEqual(len(leak['top_sites']), 3)
+        self.assertIn('test_allocations.py', leak['top_sites'][0]['site'])
+        self.assertGreaterEqual(leak['top_sites'][0]['size'], 512 * 1024)
+        spike = report['routes']['/spike']
+        self.assertGreaterEqual(spike['max_peak_bytes'], 512 * 1024)
+        self.assertLess(spike['max_net_bytes'], 256 * 1024)
+
+    def test_should_not_sample_when_stopped(self):
+        tracker = AllocationTracker(sample_rate=1.0)
+        request = Request({"PATH_INFO": '/', "REQUEST_METHOD": 'GET'})
+        self.assertEqual(tracker(request, None, lambda: 'done'), 'done')
+        self.assertEqual(tracker.report(), {})
+
+    def test_should_sample_when_tracing_was_already_started(self):
+        tracker = AllocationTracker(sample_rate=1.0, track_sites=False)
+        request = Request({"PATH_INFO": '/', "REQUEST_METHOD": 'GET'})
+        was_tracing = tracemalloc.is_tracing()
+        tracemalloc.start()
+        try:
+            tracker.start()
+            tracker(request, None, lambda: bytearray(1024))
+            tracker.stop()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        self.assertEqual(tracker.report()['<unmatched>']['samples'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# Standard libs imports
+import json
+import socket
+import asyncio
+import unittest
+from unittest import TestCase
+from http.client import HTTPConnection
+from test.mixins import HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import NextFunction, parse_body_json
+from py_sugo.async_application import AsyncNextFunction, AsyncApplication
+
+
+class AsyncApplicationTestCase(HttpRequestMixin, TestCase):
+    port: int = 50014
+
+    @staticmethod
+    async def async_middleware(request: Request, response: Response, next_layer: AsyncNextFunction):
+        request.params['async_middleware'] = True
+        await asyncio.sleep(0)
+        return await next_layer()
+
+    @staticmethod
+    def sync_middleware(request: Request, response: Response, next_layer: NextFunction):
+        request.params['sync_middleware'] = True
+        return next_layer()
+
+    def test_should_run_async_and_sync_layers(self):
+        async def handler(request: Request, response: Response):
+            await asyncio.sleep(0)
+            return response.status(201).json({"params": request.params, "body": request.body})
+
+        application = AsyncApplication(handler)
+        application.use_middleware(self.async_middleware)
+        application.use_middleware(self.sync_middleware)
+        application.use_middleware(parse_body_json)
+        application.listen(port=self.port, parallel=True)
+        try:
+            response = self.http_request('POST', '/', body={"hello": 1}, headers={"content-type": "application/json"}, port=self.port)
+            body = json.loads(response.read())
+        finally:
+            application.close()
+        self.assertEqual(response.status, 201)
+        self.assertEqual(body['params'], {"async_middleware": True, "sync_middleware": True})
+        self.assertEqual(body['body'], {"hello": 1})
+
+    def test_should_run_sync_handlers_and_keep_the_connection_alive(self):
+        def handler(request: Request, response: Response):
+            return response.json({"path": request.path})
+
+        port = self.port + 1
+        application = AsyncApplication(handler)
+        application.listen(port=port, parallel=True)
+        connection = HTTPConnection('localhost', port)
+        try:
+            for path in ['/first', '/second']:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                self.assertEqual(json.loads(response.read())['path'], path)
+        finally:
+            connection.close()
+            application.close()
+
+    def test_should_run_more_sync_layers_than_executor_workers(self):
+        async def async_middleware(request: Request, response: Response, next_layer: AsyncNextFunction):
+            return await next_layer()
+
+        def handler(request: Request, response: Response):
+            return response.json({"params": request.params})
+
+        port = 50034
+        application = AsyncApplication(handler, executor_workers=1)
+        application.use_middleware(self.sync_middleware)
+        application.use_middleware(async_middleware)
+        application.use_middleware(parse_body_json)
+        application.use_middleware(self.sync_middleware)
+        application.listen(port=port, parallel=True)
+        try:
+            connection = HTTPConnection('localhost', port, timeout=5)
+            connection.request('GET', '/')
+            body = json.loads(connection.getresponse().read())
+            connection.close()
+        finally:
+            application.close()
+        self.assertEqual(body['params'], {"sync_middleware": True})
+
+    def test_should_read_chunked_bodies_and_limit_their_size(self):
+        def handler(request: Request, response: Response):
+            return response.send(request.raw_body)
+
+        port = 50035
+        application = AsyncApplication(handler, max_body_size=8)
+        application.listen(port=port, parallel=True)
+        try:
+            with socket.create_connection(('localhost', port), timeout=5) as client:
+                client.sendall(b'POST / HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n'
+                               b'GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+                first, second = self.read_until_closed(client).split(b'HTTP/1.1 ')[1:]
+            with socket.create_connection(('localhost', port), timeout=5) as client:
+                client.sendall(b'POST / HTTP/1.1\r\nHost: localhost\r\nContent-Length: 9\r\n\r\n')
+                too_large = self.read_until_closed(client)
+        finally:
+            application.close()
+        self.assertTrue(first.startswith(b'200') and first.endswith(b'\r\n\r\nhello'))
+        self.assertTrue(second.startswith(b'200') and second.endswith(b'\r\n\r\n'))
+        self.assertTrue(too_large.startswith(b'HTTP/1.1 413'))
+
+    @staticmethod
+    def read_until_closed(client: socket.socket) -> bytes:
+        data = b''
+        chunk = client.recv(65536)
+        while chunk:
+            data += chunk
+            chunk = client.recv(65536)
+        return data
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# Standard libs imports
+import gzip
+import json
+import zlib
+import unittest
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler, CompressionMiddleware, parse_accept_encoding
+
+ITEMS = [{"id": index, "name": "item %d" % index} for index in range(200)]
+
+
+class CompressionMiddlewareTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50024
+    compression: CompressionMiddleware = CompressionMiddleware(minimum_size=256, level=9)
+    middleware = [compression]
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def large(request: Request, response: Response):
+            response.headers['ETag'] = '"items"'
+            return response.json({"items": ITEMS})
+
+        def small(request: Request, response: Response):
+            return response.json({"small": True})
+
+        router = Router()
+        router.get('/large', large)
+        router.get('/small', small)
+        return router.handle
+
+    def test_should_gzip_large_bodies(self):
+        response = self.http_request('GET', '/large', headers={"Accept-Encoding": 'deflate;q=0.5, gzip'}, port=self.port)
+        self.assertEqual(response.getheader('content-encoding'), 'gzip')
+        self.assertEqual(response.getheader('vary'), 'Accept-Encoding')
+        self.assertEqual(response.getheader('etag'), 'W/"items"')
+        self.assertEqual(json.loads(gzip.decompress(response.read()))['items'], ITEMS)
+
+    def test_should_deflate_when_gzip_is_refused(self):
+        response = self.http_request('GET', '/large', headers={"Accept-Encoding": 'gzip;q=0, deflate'}, port=self.port)
+        self.assertEqual(response.getheader('content-encoding'), 'deflate')
+        self.assertEqual(json.loads(zlib.decompress(response.read()))['items'], ITEMS)
+
+    def test_should_not_compress_without_negotiation_or_below_the_threshold(self):
+        response = self.http_request('GET', '/large', port=self.port)
+        self.assertIsNone(response.getheader('content-encoding'))
+        self.assertEqual(response.getheader('vary'), 'Accept-Encoding')
+        self.assertEqual(json.loads(response.read())['items'], ITEMS)
+        response = self.http_request('GET', '/small', headers={"Accept-Encoding": 'gzip'}, port=self.port)
+        self.assertIsNone(response.getheader('content-encoding'))
+        self.assertEqual(json.loads(response.read()), {"small": True})
+
+    def test_should_reuse_compressed_bodies(self):
+        body = json.dumps({"items": ITEMS}).encode('utf-8')
+        self.assertIs(self.compression.compress(body, 'gzip'), self.compression.compress(body, 'gzip'))
+
+    def test_should_bound_the_compressed_body_cache(self):
+        compression = CompressionMiddleware(cache_bytes=1024, max_cached_body=4096)
+        bodies = [json.dumps({"items": ITEMS[:20], "page": page}).encode('utf-8') for page in range(10)]
+        for body in bodies:
+            compression.compress(body, 'gzip')
+        self.assertLess(len(compression._cache), len(bodies))
+        self.assertLessEqual(compression._cached_bytes, 1024)
+        self.assertEqual(compression._cached_bytes, sum(len(compressed) for compressed in compression._cache.values()))
+        large = b'x' * 8192
+        self.assertIsNot(compression.compress(large, 'gzip'), compression.compress(large, 'gzip'))
+        small = b'y' * 1024
+        self.assertIsNot(compression.compress(small, 'gzip', cache=False), compression.compress(small, 'gzip', cache=False))
+
+    def test_should_parse_accept_encoding(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.8, br, *;q=0'), {"gzip": 0.8, "br": 1.0, "*": 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Standard libs imports
+import json
+import unittest
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import ErrorHandler, RequestHandler, logger
+
+
+class InvalidItemException(Exception):
+    status_code: int = 422
+
+    def __init__(self, message: str):
+        super(InvalidItemException, self).__init__(message)
+        self.message = message
+
+
+class ErrorHandlerTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50028
+    error_handler: ErrorHandler = ErrorHandler(debug=False, max_tracebacks_per_second=1)
+    middleware = [error_handler]
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def fail(request: Request, response: Response):
+            response.json({"partial": True})
+            raise RuntimeError('secret details')
+
+        def invalid(request: Request, response: Response):
+            raise InvalidItemException('name is required')
+
+        router = Router()
+        router.get('/fail', fail)
+        router.get('/invalid', invalid)
+        return router.handle
+
+    def test_should_hide_server_error_details(self):
+        with self.assertLogs(logger, 'ERROR'):
+            response = self.http_request('GET', '/fail', headers={"X-Request-ID": 'abc'}, port=self.port)
+            body = json.loads(response.read())
+        self.assertEqual(response.status, 500)
+        self.assertEqual(body, {"error": 'RuntimeError', "status_code": 500, "request_id": 'abc', "message": 'Internal Server Error'})
+
+    def test_should_expose_client_error_messages(self):
+        response = self.http_request('GET', '/invalid', port=self.port)
+        body = json.loads(response.read())
+        self.assertEqual(response.status, 422)
+        self.assertEqual(body['message'], 'name is required')
+        self.assertEqual(body['error'], 'InvalidItemException')
+        self.assertNotIn('traceback', body)
+
+    def test_should_rate_limit_tracebacks(self):
+        with self.assertLogs(logger, 'ERROR') as logs:
+            for _ in range(5):
+                self.http_request('GET', '/fail', port=self.port).read()
+        with_traceback = [record for record in logs.records if record.exc_info]
+        self.assertLessEqual(len(with_traceback), 2)
+        self.assertEqual(len(logs.records), 5)
+        self.assertGreaterEqual(self.error_handler.suppressed_tracebacks, 3)
+
+    def test_should_keep_the_debug_body(self):
+        request = Request({"PATH_INFO": '/', "REQUEST_METHOD": 'GET'})
+        response = Response(lambda status, headers: None, request)
+
+        def next_layer():
+            raise InvalidItemException('debug')
+
+        with self.assertLogs(logger, 'ERROR'):
+            ErrorHandler(debug=True)(request, response, next_layer)
+        body = json.loads(response.body)
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('traceback', body)
+        self.assertEqual(body['message'], 'debug')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# Standard libs imports
+import json
+import unittest
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.headers import format_etag, etag_matches
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import ETagMiddleware, RequestHandler
+
+
+class ETagMiddlewareTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50027
+    built: int = 0
+    middleware = [ETagMiddleware()]
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def hashed(request: Request, response: Response):
+            return response.json({"hello": 'world'})
+
+        def versioned(request: Request, response: Response):
+            if response.etag('v42', weak=True):
+                return
+            cls.built += 1
+            return response.json({"version": 42})
+
+        router = Router()
+        router.get('/hashed', hashed)
+        router.get('/versioned', versioned)
+        return router.handle
+
+    def test_should_hash_bodies_into_etags(self):
+        response = self.http_request('GET', '/hashed', port=self.port)
+        etag = response.getheader('etag')
+        self.assertEqual(json.loads(response.read()), {"hello": 'world'})
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        response = self.http_request('GET', '/hashed', headers={"If-None-Match": etag}, port=self.port)
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.getheader('etag'), etag)
+        self.assertIsNone(response.getheader('content-type'))
+        self.assertIsNone(response.getheader('content-length'))
+        self.assertEqual(response.read(), b'')
+        response = self.http_request('GET', '/hashed', headers={"If-None-Match": '"stale"'}, port=self.port)
+        self.assertEqual(response.status, 200)
+
+    def test_should_skip_building_bodies_for_fresh_versions(self):
+        response = self.http_request('GET', '/versioned', port=self.port)
+        response.read()
+        self.assertEqual(response.getheader('etag'), 'W/"v42"')
+        built = self.built
+        response = self.http_request('GET', '/versioned', headers={"If-None-Match": '"v41", W/"v42"'}, port=self.port)
+        self.assertEqual(response.status, 304)
+        self.assertEqual(self.built, built)
+
+    def test_should_compare_etags(self):
+        self.assertEqual(format_etag('abc'), '"abc"')
+        self.assertEqual(format_etag('"abc"', weak=True), 'W/"abc"')
+        self.assertTrue(etag_matches('W/"abc"', '"abc"'))
+        self.assertTrue(etag_matches('*', '"abc"'))
+        self.assertFalse(etag_matches('"abcd", "ab"', '"abc"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
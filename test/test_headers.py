@@ -0,0 +1,47 @@
+# Standard libs imports
+import io
+import unittest
+from unittest import TestCase
+
+# First party libs imports
+from py_sugo.headers import HeaderMap
+from py_sugo.request import Request
+
+
+class HeaderMapTestCase(TestCase):
+    def test_should_be_case_insensitive_and_keep_every_value(self):
+        headers = HeaderMap()
+        headers.add_header('Set-Cookie', 'a=1')
+        headers.add_header('set-cookie', 'b=2')
+        headers.add_header('Content-Disposition', 'attachment', filename='report.csv')
+        self.assertEqual(headers.get('SET-COOKIE'), 'a=1')
+        self.assertEqual(headers.get_all('set-cookie'), ['a=1', 'b=2'])
+        self.assertEqual(headers.items(), [('Set-Cookie', 'a=1'), ('Set-Cookie', 'b=2'),
+                                           ('Content-Disposition', 'attachment; filename="report.csv"')])
+        self.assertEqual(len(headers), 3)
+
+    def test_should_replace_and_delete_headers(self):
+        headers = HeaderMap([('ETag', '"1"'), ('Vary', 'Accept')])
+        headers['etag'] = '"2"'
+        del headers['VARY']
+        self.assertEqual(headers.items(), [('etag', '"2"')])
+        self.assertNotIn('Vary', headers)
+        self.assertIsNone(headers['Vary'])
+        self.assertEqual(headers.get('Vary', ''), '')
+
+    def test_request_should_keep_every_header(self):
+        request = Request({
+            "HTTP_X_FORWARDED_FOR": '10.0.0.1',
+            "HTTP_X_CUSTOM_AUTH": 'token',
+            "CONTENT_TYPE": 'application/json',
+            "CONTENT_LENGTH": '',
+            "wsgi.input": io.BytesIO()
+        })
+        self.assertEqual(request.headers.get('x-forwarded-for'), '10.0.0.1')
+        self.assertEqual(request.headers.get('X-Custom-Auth'), 'token')
+        self.assertEqual(request.headers.get('Content-Type'), 'application/json')
+        self.assertNotIn('Content-Length', request.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
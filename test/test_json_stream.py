@@ -0,0 +1,80 @@
+# Standard libs imports
+import json
+import uuid
+import datetime
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+from dataclasses import dataclass
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import SuGoJSONEncoder, Response, iter_json_chunks
+from py_sugo.middleware import RequestHandler
+
+
+@dataclass
+class Item:
+    id: int
+    price: Decimal
+    created: datetime.date
+
+
+class JsonStreamTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50025
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def items():
+            return (Item(index, Decimal('%d.10' % index), datetime.date(2020, 1, 1)) for index in range(1000))
+
+        def array(request: Request, response: Response):
+            response.json_stream(items(), chunk_size=1024)
+
+        def ndjson(request: Request, response: Response):
+            response.json_stream(items(), ndjson=True)
+
+        def single(request: Request, response: Response):
+            return response.json({"item": Item(1, Decimal('1.10'), datetime.date(2020, 1, 1))})
+
+        router = Router()
+        router.get('/array', array)
+        router.get('/ndjson', ndjson)
+        router.get('/single', single)
+        return router.handle
+
+    def test_should_stream_json_arrays(self):
+        response = self.http_request('GET', '/array', port=self.port)
+        self.assertEqual(response.getheader('content-type'), 'application/json')
+        body = json.loads(response.read())
+        self.assertEqual(len(body), 1000)
+        self.assertEqual(body[999], {"id": 999, "price": '999.10', "created": '2020-01-01'})
+
+    def test_should_stream_ndjson(self):
+        response = self.http_request('GET', '/ndjson', port=self.port)
+        self.assertEqual(response.getheader('content-type'), 'application/x-ndjson')
+        lines = response.read().decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(json.loads(lines[0])['id'], 0)
+
+    def test_should_encode_extra_types_in_json_responses(self):
+        response = self.http_request('GET', '/single', port=self.port)
+        self.assertEqual(json.loads(response.read())['item']['price'], '1.10')
+
+    def test_should_flush_in_chunks(self):
+        chunks = list(iter_json_chunks(range(10000), SuGoJSONEncoder(), chunk_size=100))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) < 200 for chunk in chunks))
+        self.assertEqual(json.loads(b''.join(chunks)), list(range(10000)))
+        self.assertEqual(b''.join(iter_json_chunks([], SuGoJSONEncoder())), b'[]')
+
+    def test_should_encode_values(self):
+        encoder = SuGoJSONEncoder(decimal_as_float=True)
+        identifier = uuid.uuid4()
+        self.assertEqual(json.loads(encoder.encode([Decimal('1.5'), identifier])), [1.5, str(identifier)])
+
+
+if __name__ == '__main__':
+    unittest.main()
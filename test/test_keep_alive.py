@@ -0,0 +1,154 @@
+# Standard libs imports
+import json
+import time
+import socket
+import unittest
+from threading import Thread
+from unittest import TestCase
+from http.client import HTTPConnection
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler
+from py_sugo.application import Application
+
+
+class KeepAliveTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50016
+    listen_kwargs = {"workers": 2, "keep_alive": True, "keep_alive_timeout": 0.5, "max_keep_alive_requests": 3}
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def handler(request: Request, response: Response):
+            return response.json({"path": request.path, "body": request.raw_body.decode('utf-8')})
+
+        return handler
+
+    def test_should_reuse_the_connection(self):
+        connection = HTTPConnection('localhost', self.port)
+        for method, path in [('GET', '/first'), ('HEAD', '/second'), ('GET', '/third')]:
+            connection.request(method, path)
+            response = connection.getresponse()
+            body = response.read()
+            self.assertEqual(response.status, 200)
+            if method == 'GET':
+                self.assertEqual(json.loads(body)['path'], path)
+        self.assertEqual(response.getheader('connection'), 'close')
+        connection.close()
+
+    def test_should_read_chunked_request_bodies(self):
+        connection = HTTPConnection('localhost', self.port)
+        connection.request('POST', '/chunked', body=iter([b'hello ', b'world']), encode_chunked=True)
+        response = connection.getresponse()
+        self.assertEqual(json.loads(response.read())['body'], 'hello world')
+        self.assertEqual(response.getheader('connection'), 'keep-alive')
+        connection.close()
+
+    def test_should_spool_large_bodies_while_they_arrive(self):
+        def handler(request: Request, response: Response):
+            wsgi_input = request.environ['wsgi.input']
+            return response.json({"size": len(request.raw_body), "rolled": getattr(wsgi_input, '_rolled', False)})
+
+        port = 50036
+        application = Application(handler, spool_threshold=1024)
+        application.listen(port=port, parallel=True, workers=1, keep_alive=True)
+        connection = HTTPConnection('localhost', port)
+        try:
+            for size in [100, 200 * 1024]:
+                connection.request('POST', '/upload', body=b'x' * size)
+                self.assertEqual(json.loads(connection.getresponse().read()), {"size": size, "rolled": size > 1024})
+        finally:
+            connection.close()
+            application.close()
+
+    def test_should_spool_chunked_bodies_while_they_arrive(self):
+        def handler(request: Request, response: Response):
+            wsgi_input = request.environ['wsgi.input']
+            return response.json({"size": len(request.raw_body), "rolled": getattr(wsgi_input, '_rolled', False)})
+
+        port = 50042
+        application = Application(handler, spool_threshold=1024, max_body_size=64 * 1024)
+        application.listen(port=port, parallel=True, workers=1, keep_alive=True)
+        connection = HTTPConnection('localhost', port)
+        try:
+            chunks = [b'x' * 1000 for _ in range(50)]
+            connection.request('POST', '/upload', body=iter(chunks), encode_chunked=True)
+            self.assertEqual(json.loads(connection.getresponse().read()), {"size": 50000, "rolled": True})
+            connection.request('POST', '/upload', body=iter([b'hello']), encode_chunked=True)
+            self.assertEqual(json.loads(connection.getresponse().read()), {"size": 5, "rolled": False})
+            connection.request('POST', '/upload', body=iter(chunks * 2), encode_chunked=True)
+            self.assertEqual(connection.getresponse().status, 413)
+        finally:
+            connection.close()
+            application.close()
+
+    def test_should_not_block_other_connections_without_workers(self):
+        def handler(request: Request, response: Response):
+            if request.path == '/slow':
+                time.sleep(1)
+            return response.json({"path": request.path})
+
+        port = 50037
+        application = Application(handler)
+        application.listen(port=port, parallel=True, keep_alive=True)
+        try:
+            slow = HTTPConnection('localhost', port)
+            slow.request('GET', '/slow')
+            time.sleep(0.1)
+            started_at = time.monotonic()
+            self.assertEqual(json.loads(self.http_request('GET', '/fast', port=port).read()), {"path": '/fast'})
+            self.assertLess(time.monotonic() - started_at, 0.5)
+            slow.getresponse().read()
+            slow.close()
+        finally:
+            application.close()
+
+    def test_should_close_idle_connections(self):
+        client = socket.create_connection(('localhost', self.port))
+        client.sendall(b'GET /idle HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        client.settimeout(5)
+        received = b''
+        while not received.endswith(b'}'):
+            received += client.recv(4096)
+        time.sleep(1.5)
+        self.assertEqual(client.recv(4096), b'')
+        client.close()
+
+    def test_should_close_keep_alive_connections_while_draining(self):
+        def handler(request: Request, response: Response):
+            if request.path == '/slow':
+                time.sleep(0.5)
+            return response.json({"path": request.path})
+
+        port = 50040
+        application = Application(handler)
+        application.listen(port=port, parallel=True, workers=2, keep_alive=True, keep_alive_timeout=30)
+        idle = socket.create_connection(('localhost', port))
+        idle.settimeout(5)
+        slow = HTTPConnection('localhost', port, timeout=5)
+        try:
+            idle.sendall(b'GET /idle HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            received = b''
+            while not received.endswith(b'}'):
+                received += idle.recv(4096)
+            slow.request('GET', '/slow')
+            time.sleep(0.1)
+            started_at = time.monotonic()
+            closing = Thread(target=application.close)
+            closing.start()
+            response = slow.getresponse()
+            self.assertEqual(json.loads(response.read()), {"path": '/slow'})
+            self.assertEqual(response.getheader('connection'), 'close')
+            self.assertEqual(idle.recv(4096), b'')
+            closing.join(5)
+            self.assertFalse(closing.is_alive())
+            self.assertLess(time.monotonic() - started_at, 3)
+        finally:
+            idle.close()
+            slow.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
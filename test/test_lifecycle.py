@@ -0,0 +1,75 @@
+# Standard libs imports
+import json
+import time
+import unittest
+from typing import List
+from unittest import TestCase
+from threading import Event, Timer, Thread
+from test.mixins import HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.application import Application
+
+
+class LifecycleTestCase(HttpRequestMixin, TestCase):
+    port: int = 50017
+
+    def test_should_drain_in_flight_requests_before_closing(self):
+        started = Event()
+        events: List[str] = list()
+
+        def handler(request: Request, response: Response):
+            started.set()
+            Event().wait(1.5)
+            return response.json({"drained": True})
+
+        application = Application(handler)
+        application.on_startup(lambda: events.append('startup'))
+        application.on_shutdown(lambda: events.append('shutdown'))
+        application.lifecycle.on_drain_progress(lambda in_flight, remaining: events.append('drain'))
+        application.listen(port=self.port, parallel=True, workers=2)
+
+        responses = list()
+        client = Thread(target=lambda: responses.append(self.http_request('GET', '/', port=self.port)))
+        client.start()
+        started.wait(5)
+        self.assertTrue(application.close(drain_timeout=5))
+        client.join()
+        self.assertEqual(json.loads(responses[0].read()), {"drained": True})
+        self.assertEqual(events[0], 'startup')
+        self.assertIn('drain', events)
+        self.assertEqual(events[-1], 'shutdown')
+
+    def test_should_give_up_draining_after_the_deadline(self):
+        started = Event()
+        release = Event()
+
+        def handler(request: Request, response: Response):
+            started.set()
+            release.wait(5)
+            return response.json({})
+
+        application = Application(handler)
+        application.listen(port=self.port + 1, parallel=True, workers=1)
+        client = Thread(target=self.http_request, args=('GET', '/'), kwargs={"port": self.port + 1})
+        client.start()
+        started.wait(5)
+        started_at = time.monotonic()
+        try:
+            self.assertFalse(application.close(drain_timeout=0.1))
+            self.assertLess(time.monotonic() - started_at, 1)
+        finally:
+            release.set()
+            client.join()
+
+    def test_blocking_listen_should_return_when_a_stop_is_requested(self):
+        application = Application(lambda request, response: response.json({}))
+        Timer(0.2, application.lifecycle.request_stop).start()
+        application.listen(port=self.port + 2)
+        self.assertIsNone(application.server_thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# Standard libs imports
+import json
+import logging
+import unittest
+from typing import List
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.logs import JsonFormatter, AsyncLogPipeline, RequestLogMiddleware, redact
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler, parse_body_json
+from py_sugo.application import Application
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(JsonFormatter())
+        self.lines: List[str] = list()
+
+    def emit(self, record: logging.LogRecord):
+        self.lines.append(self.format(record))
+
+
+class RequestLogMiddlewareTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50029
+    handler: ListHandler
+    pipeline: AsyncLogPipeline
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def login(request: Request, response: Response):
+            return response.json({"token": 'x' * 100})
+
+        def health(request: Request, response: Response):
+            return response.send(b'ok')
+
+        router = Router()
+        router.post('/login', login)
+        router.get('/health', health)
+        return router.handle
+
+    @classmethod
+    def setup_application(cls, application: Application):
+        request_logger = logging.Logger('test_request_log')
+        cls.handler = ListHandler()
+        request_logger.addHandler(cls.handler)
+        cls.pipeline = AsyncLogPipeline(request_logger)
+        cls.pipeline.start()
+        application.use_middleware(RequestLogMiddleware(request_logger, sample_rates={"/health": 0}, max_body_size=16))
+        application.use_middleware(parse_body_json)
+
+    def test_should_write_sampled_structured_records_in_the_background(self):
+        body = {"user": 'admin', "password": 'hunter2'}
+        self.http_request('POST', '/login', body=body, headers={"content-type": 'application/json'}, port=self.port).read()
+        self.http_request('GET', '/health', port=self.port).read()
+        self.pipeline.stop()
+        records = [json.loads(line) for line in self.handler.lines]
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record['message'], 'POST /login --> 200')
+        self.assertEqual(record['route'], '/login')
+        self.assertEqual(record['request_body'], {"user": 'admin', "password": '[REDACTED]'})
+        self.assertEqual(record['response_body'], '{"token": "xxxxx...')
+        self.assertIn('duration_ms', record)
+        self.assertEqual(self.pipeline.dropped, 0)
+
+    def test_should_redact_nested_values(self):
+        value = {"items": [{"Token": 'abc'}], "name": 'a' * 10}
+        self.assertEqual(redact(value, {'token'}, 4), {"items": [{"Token": '[REDACTED]'}], "name": 'aaaa...'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# Standard libs imports
+import unittest
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.metrics import MetricsMiddleware
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler
+
+
+class MetricsMiddlewareTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50030
+    metrics: MetricsMiddleware = MetricsMiddleware(buckets=(0.5, 0.1))
+    middleware = [metrics]
+    listen_kwargs = {"workers": 2}
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def item(request: Request, response: Response):
+            return response.json({"id": request.params['id']})
+
+        router = Router()
+        router.get('/items/<int:id>', item)
+        router.mount('/internal', cls.metrics.router())
+        return router.handle
+
+    def test_should_expose_per_route_metrics(self):
+        for path in ['/items/1', '/items/2', '/missing']:
+            self.http_request('POST' if path == '/missing' else 'GET', path, body=b'12345', port=self.port).read()
+        response = self.http_request('GET', '/internal/metrics', port=self.port)
+        text = response.read().decode('utf-8')
+        self.assertTrue(response.getheader('content-type').startswith('text/plain; version=0.0.4'))
+        labels = 'method="GET",route="/items/<int:id>",status="2xx"'
+        self.assertIn('py_sugo_requests_total{%s} 2' % labels, text)
+        self.assertIn('py_sugo_request_size_bytes_total{%s} 10' % labels, text)
+        self.assertIn('py_sugo_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels, text)
+        self.assertIn('py_sugo_request_duration_seconds_count{%s} 2' % labels, text)
+        self.assertIn('le="0.1"', text)
+        self.assertIn('py_sugo_requests_total{method="POST",route="<unmatched>",status="4xx"} 1', text)
+        self.assertIn('py_sugo_requests_in_flight 1', text)
+
+    def test_should_count_failures_as_server_errors(self):
+        metrics = MetricsMiddleware()
+        request = Request({"PATH_INFO": '/boom', "REQUEST_METHOD": 'GET'})
+        response = Response(lambda status, headers: None, request)
+
+        def next_layer():
+            raise RuntimeError()
+
+        self.assertRaises(RuntimeError, metrics, request, response, next_layer)
+        self.assertIn('status="5xx"} 1', metrics.render())
+        self.assertEqual(metrics.stats(), {"requests": 1, "in_flight": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
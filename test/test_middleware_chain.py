@@ -0,0 +1,49 @@
+# Standard libs imports
+import unittest
+from typing import Any, List
+from unittest import TestCase
+
+# First party libs imports
+from py_sugo.middleware import NextFunction, MiddlewareChain
+
+
+class MiddlewareChainTestCase(TestCase):
+    def test_should_run_every_layer_then_the_handler(self):
+        calls: List[str] = list()
+
+        def first(request: Any, response: Any, next_layer: NextFunction):
+            calls.append('first')
+            return next_layer()
+
+        def second(request: Any, response: Any, next_layer: NextFunction):
+            calls.append('second')
+            return next_layer()
+
+        chain = MiddlewareChain([first, second], lambda request, response: calls.append('handler') or 'done')
+        self.assertEqual(chain(None, None), 'done')
+        self.assertEqual(calls, ['first', 'second', 'handler'])
+
+    def test_should_be_reentrant(self):
+        seen: List[Any] = list()
+
+        def record(request: List, response: Any, next_layer: NextFunction):
+            request.append('layer')
+            return next_layer()
+
+        def handler(request: List, response: Any):
+            # A nested request through the same chain must not move the cursor of the outer one
+            if not seen:
+                inner: List = list()
+                seen.append(inner)
+                chain(inner, None)
+            request.append('handler')
+
+        chain = MiddlewareChain([record, record], handler)
+        outer: List = list()
+        chain(outer, None)
+        self.assertEqual(outer, ['layer', 'layer', 'handler'])
+        self.assertEqual(seen[0], ['layer', 'layer', 'handler'])
+
+
+if __name__ == '__main__':
+    unittest.main()
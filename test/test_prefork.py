@@ -0,0 +1,103 @@
+# Standard libs imports
+import os
+import json
+import time
+import signal
+import unittest
+from unittest import TestCase
+from http.client import HTTPConnection
+from test.mixins import HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.application import Application
+
+
+class PreforkTestCase(HttpRequestMixin, TestCase):
+    port: int = 50013
+
+    def wait_for_children(self, application: Application, count: int):
+        deadline = time.monotonic() + 5
+        while application.stats()['alive_processes'] != count and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def test_should_serve_from_child_processes_and_respawn_them(self):
+        def handler(request: Request, response: Response):
+            return response.json({"pid": os.getpid()})
+
+        application = Application(handler)
+        application.listen(port=self.port, parallel=True, processes=2)
+        try:
+            self.wait_for_children(application, 2)
+            response = self.http_request('GET', '/', port=self.port)
+            body = json.loads(response.read())
+            self.assertIn(body['pid'], application.server.children)
+
+            killed_pid = next(iter(application.server.children))
+            os.kill(killed_pid, signal.SIGKILL)
+            deadline = time.monotonic() + 5
+            while killed_pid in application.server.children and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.wait_for_children(application, 2)
+            self.assertNotIn(killed_pid, application.server.children)
+            self.assertEqual(application.stats()['alive_processes'], 2)
+        finally:
+            children = set(application.server.children)
+            application.close()
+        for pid in children:
+            self.assertRaises(ChildProcessError, os.waitpid, pid, os.WNOHANG)
+
+    def test_should_serve_keep_alive_connections_from_every_child(self):
+        def handler(request: Request, response: Response):
+            return response.json({"pid": os.getpid()})
+
+        port = 50039
+        application = Application(handler)
+        application.listen(port=port, parallel=True, processes=3, keep_alive=True)
+        try:
+            self.wait_for_children(application, 3)
+            pids = set()
+            for _ in range(30):
+                connection = HTTPConnection('localhost', port, timeout=5)
+                try:
+                    for _ in range(2):
+                        connection.request('GET', '/')
+                        response = connection.getresponse()
+                        self.assertEqual(response.status, 200)
+                        pids.add(json.loads(response.read())['pid'])
+                finally:
+                    connection.close()
+            self.assertGreater(len(pids), 1)
+            self.assertTrue(pids.issubset(application.server.children))
+        finally:
+            application.close()
+
+    def test_should_replace_children_whose_serve_loop_died_with_a_backoff(self):
+        def handler(request: Request, response: Response):
+            return response.json({"pid": os.getpid()})
+
+        application = Application(handler)
+
+        @application.on_startup
+        def break_serve_loop():
+            application.server.server.serve_forever = lambda: 1 / 0
+
+        application.listen(port=50041, parallel=True, processes=1)
+        try:
+            first_pid = next(iter(application.server.children))
+            deadline = time.monotonic() + 5
+            while first_pid in application.server.children and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertNotIn(first_pid, application.server.children)
+            deadline = time.monotonic() + 5
+            while application.server._quick_failures < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertGreaterEqual(application.server._quick_failures, 2)
+            self.assertGreater(application.server._respawn_at, 0)
+        finally:
+            application.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# Standard libs imports
+import os
+import time
+import pstats
+import unittest
+import tempfile
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.profiling import Profiler
+from py_sugo.middleware import NextFunction, RequestHandler, MiddlewareChain, parse_body_json
+from py_sugo.application import Application
+
+
+def slow_middleware(request: Request, response: Response, next_layer: NextFunction):
+    time.sleep(0.05)
+    return next_layer()
+
+
+class ProfilerTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50031
+    dump_path: str
+    profiler: Profiler
+    router: Router
+    middleware = [parse_body_json]
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def item(request: Request, response: Response):
+            time.sleep(0.02)
+            return response.json({"id": request.params['id']})
+
+        cls.dump_path = os.path.join(tempfile.mkdtemp(), 'requests.prof')
+        cls.profiler = Profiler(profile_rate=1.0, dump_path=cls.dump_path, dump_every=1)
+        cls.router = Router()
+        cls.router.get('/items/<int:id>', slow_middleware, item)
+        cls.router.use_profiler(cls.profiler)
+        return cls.router.handle
+
+    @classmethod
+    def setup_application(cls, application: Application):
+        application.use_profiler(cls.profiler)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        if os.path.exists(cls.dump_path):
+            os.remove(cls.dump_path)
+
+    def test_should_time_each_layer_and_handler(self):
+        self.http_request('GET', '/items/1', port=self.port).read()
+        stats = self.profiler.layer_stats()
+        self.assertGreaterEqual(stats['GET /items/<int:id> slow_middleware']['mean_ms'], 50)
+        self.assertLess(stats['GET /items/<int:id> slow_middleware']['mean_ms'], 70)
+        self.assertGreaterEqual(stats['GET /items/<int:id> ProfilerTestCase.get_request_handler.<locals>.item']['mean_ms'], 20)
+        self.assertLess(stats['parse_body_json']['mean_ms'], 20)
+        self.assertGreaterEqual(stats['Router.handle']['calls'], 1)
+
+    def test_should_profile_and_dump_sampled_requests(self):
+        self.http_request('GET', '/items/2', port=self.port).read()
+        self.assertGreaterEqual(self.profiler.profiled_requests, 1)
+        function_names = [function[2] for function in pstats.Stats(self.dump_path).stats]
+        self.assertIn('slow_middleware', function_names)
+
+    def test_should_keep_only_slow_profiles(self):
+        profiler = Profiler(threshold=0.01)
+        chain = profiler.instrument([], lambda request, response: time.sleep(request.params['sleep']), profile=True)
+        for sleep in [0, 0.02]:
+            request = Request({"PATH_INFO": '/', "REQUEST_METHOD": 'GET'})
+            request.params['sleep'] = sleep
+            chain(request, None)
+        self.assertEqual(profiler.profiled_requests, 1)
+
+    def test_should_not_touch_chains_without_profiler(self):
+        router = Router().get('/', slow_middleware, lambda request, response: None)
+        self.assertIs(router.routes[0].chain.layers[0], slow_middleware)
+        router.use_profiler(Profiler())
+        router.use_profiler(None)
+        self.assertIsInstance(router.routes[0].chain, MiddlewareChain)
+        self.assertIs(router.routes[0].chain.layers[0], slow_middleware)
+
+
+if __name__ == '__main__':
+    unittest.main()
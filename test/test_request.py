@@ -1,10 +1,14 @@
 # Standard libs imports
+import io
 import json
 import unittest
 from typing import Dict
 from unittest import TestCase
 from test.mixins import ServerTestMixin, HttpRequestMixin
 
+# First party libs imports
+from py_sugo.request import Request
+
 
 class RequestTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
     def test_request_id_should_be_set(self):
@@ -17,6 +21,27 @@ class RequestTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
         response_body: Dict = json.loads(response.read())
         self.assertEqual(response_body.get('path'), '/hello')
 
+    def test_request_id_should_come_from_the_x_request_id_header(self):
+        response = self.http_request('GET', '/hello', headers={"X-Request-ID": 'abc-123'})
+        response_body: Dict = json.loads(response.read())
+        self.assertEqual(response_body.get('id'), 'abc-123')
+
+
+class LazyRequestTestCase(TestCase):
+    def test_should_not_read_anything_until_used(self):
+        wsgi_input = io.BytesIO(b'hello')
+        request = Request({"REQUEST_METHOD": 'POST', "PATH_INFO": '/', "CONTENT_LENGTH": '5', "QUERY_STRING": 'a=1', "wsgi.input": wsgi_input})
+        self.assertEqual(wsgi_input.tell(), 0)
+        self.assertEqual(request.raw_body, b'hello')
+        self.assertEqual(request.query, {"a": ['1']})
+        self.assertFalse(hasattr(request, '__dict__'))
+
+    def test_generated_ids_should_be_unique(self):
+        first = Request({"wsgi.input": io.BytesIO()})
+        second = Request({"wsgi.input": io.BytesIO()})
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(first.id, first.id)
+
 
 if __name__ == '__main__':
     unittest.main()
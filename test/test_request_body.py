@@ -0,0 +1,65 @@
+# Standard libs imports
+import io
+import unittest
+from unittest import TestCase
+from test.mixins import HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request, RequestEntityTooLargeException
+from py_sugo.response import Response
+from py_sugo.application import Application
+
+
+class RequestBodyTestCase(HttpRequestMixin, TestCase):
+    port: int = 50020
+
+    @staticmethod
+    def make_request(body: bytes, chunked: bool = False, **kwargs) -> Request:
+        environ = {"REQUEST_METHOD": 'POST', "PATH_INFO": '/', "wsgi.input": io.BytesIO(body)}
+        if chunked:
+            environ['HTTP_TRANSFER_ENCODING'] = 'chunked'
+        else:
+            environ['CONTENT_LENGTH'] = str(len(body))
+        return Request(environ, **kwargs)
+
+    def test_should_iterate_the_body_in_chunks(self):
+        request = self.make_request(b'0123456789')
+        self.assertEqual(list(request.iter_body(chunk_size=4)), [b'0123', b'4567', b'89'])
+
+    def test_should_decode_chunked_bodies(self):
+        request = self.make_request(b'5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\n', chunked=True)
+        buffer = bytearray(8)
+        self.assertEqual(request.readinto(buffer), 5)
+        self.assertEqual(bytes(buffer[:5]), b'hello')
+        self.assertEqual(request.raw_body, b' world')
+
+    def test_should_spill_large_bodies_to_disk(self):
+        request = self.make_request(b'x' * 100, spool_threshold=10)
+        self.assertTrue(request.body_file._rolled)
+        self.assertEqual(request.raw_body, b'x' * 100)
+
+    def test_should_read_the_whole_body_after_the_body_file(self):
+        request = self.make_request(b'x' * 100, spool_threshold=10)
+        self.assertEqual(request.body_file.read(), b'x' * 100)
+        self.assertEqual(request.raw_body, b'x' * 100)
+        self.assertEqual(request.body_file.read(), b'')
+
+    def test_should_stop_reading_once_the_limit_is_passed(self):
+        request = self.make_request(b'a\r\n0123456789\r\n0\r\n\r\n', chunked=True, max_body_size=5)
+        self.assertRaises(RequestEntityTooLargeException, lambda: request.raw_body)
+
+    def test_should_answer_413_before_running_the_handler(self):
+        def handler(request: Request, response: Response):
+            raise AssertionError('The handler should not run')
+
+        application = Application(handler, max_body_size=5)
+        application.listen(port=self.port, parallel=True)
+        try:
+            response = self.http_request('POST', '/', body=b'0123456789', port=self.port)
+            self.assertEqual(response.status, 413)
+        finally:
+            application.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,7 @@ from test.mixins import ServerTestMixin, HttpRequestMixin
 
 # First party libs imports
 from py_sugo.request import Request
-from py_sugo.response import Response
+from py_sugo.response import Response, ResponseAlreadySentException, register_status
 from py_sugo.middleware import RequestHandler
 
 
@@ -31,5 +31,48 @@ class ResponseTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
         self.assertTrue(body.get('hello'))
 
 
+class ResponseUnitTestCase(TestCase):
+    def setUp(self):
+        self.started: Dict = dict()
+
+        def start_response(status, headers, exc_info=None):
+            self.started['status'] = status
+            self.started['headers'] = headers
+
+        self.response = Response(start_response, Request({"PATH_INFO": '/', "REQUEST_METHOD": 'GET'}))
+
+    def test_should_commit_the_status_line_and_content_length(self):
+        self.response.status(201).headers['Content-Length'] = '999'
+        self.response.send(b'hello')
+        self.assertEqual(self.response.commit(dict()), [b'hello'])
+        self.assertEqual(self.started['status'], '201 Created')
+        self.assertEqual(self.started['headers'], [('Content-Length', '5')])
+
+    def test_should_not_send_a_content_length_without_a_body(self):
+        for status_code in [204, 304]:
+            self.response.clear()
+            self.response.status(status_code).headers['Content-Length'] = '0'
+            self.response.send(b'')
+            self.assertEqual(list(self.response.commit(dict())), [b''])
+            self.assertEqual(self.started['headers'], [])
+
+    def test_should_support_registered_status_codes(self):
+        register_status(599, 'Network Connect Timeout Error')
+        self.response.status(599).send(b'')
+        self.response.commit(dict())
+        self.assertEqual(self.started['status'], '599 Network Connect Timeout Error')
+        self.response.clear()
+        self.response.status(999).send(b'')
+        self.assertRaises(ValueError, self.response.commit, dict())
+
+    def test_should_refuse_to_send_twice(self):
+        self.response.json({"first": True})
+        self.assertRaises(ResponseAlreadySentException, self.response.send, b'second')
+        self.response.clear()
+        self.response.send(b'second')
+        self.assertEqual(self.response.body, b'second')
+        self.assertNotIn('Content-Type', self.response.headers)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,115 @@
+# Standard libs imports
+import json
+import time
+import unittest
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.cache import CacheEntry, ResponseCacheMiddleware
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler
+
+
+class ResponseCacheMiddlewareTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50026
+    calls: int = 0
+    cache: ResponseCacheMiddleware = ResponseCacheMiddleware(ttl=60, route_ttls={"/fast/<int:id>": 0.2})
+    middleware = [cache]
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        def item(request: Request, response: Response):
+            cls.calls += 1
+            return response.json({"calls": cls.calls, "id": request.params['id'], "query": request.query})
+
+        def update_item(request: Request, response: Response):
+            return response.json({"updated": True})
+
+        def session(request: Request, response: Response):
+            response.headers['Set-Cookie'] = 'session=1'
+            return response.json({"calls": cls.calls})
+
+        def profile(request: Request, response: Response):
+            if request.query.get('private'):
+                response.headers['Cache-Control'] = 'private, max-age=60'
+            return response.json({"cookie": request.headers.get('Cookie')})
+
+        router = Router()
+        router.get('/items/<int:id>', item).put('/items/<int:id>', update_item)
+        router.get('/fast/<int:id>', item)
+        router.get('/session', session)
+        router.get('/profile', profile)
+        return router.handle
+
+    def setUp(self):
+        self.cache.clear()
+
+    def get_json(self, path: str, headers=None):
+        response = self.http_request('GET', path, headers=headers, port=self.port)
+        return response, json.loads(response.read())
+
+    def test_should_answer_repeated_requests_from_the_cache(self):
+        _, first = self.get_json('/items/1?b=2&a=1')
+        response, second = self.get_json('/items/1?a=1&b=2')
+        self.assertEqual(first, second)
+        self.assertIsNotNone(response.getheader('age'))
+        self.assertEqual(response.getheader('content-type'), 'application/json')
+        _, other = self.get_json('/items/1?a=2')
+        self.assertNotEqual(other['calls'], first['calls'])
+        _, encoded = self.get_json('/items/1?b=2&a=1', headers={"Accept-Encoding": 'gzip'})
+        self.assertNotEqual(encoded['calls'], first['calls'])
+
+    def test_should_expire_entries_with_the_route_ttl(self):
+        _, first = self.get_json('/fast/1')
+        _, second = self.get_json('/fast/1')
+        self.assertEqual(first, second)
+        time.sleep(0.3)
+        _, third = self.get_json('/fast/1')
+        self.assertNotEqual(first, third)
+
+    def test_should_invalidate_on_writes_and_explicitly(self):
+        _, first = self.get_json('/items/2')
+        self.http_request('PUT', '/items/2', port=self.port).read()
+        _, second = self.get_json('/items/2')
+        self.assertNotEqual(first, second)
+        self.cache.invalidate_prefix('/items/')
+        _, third = self.get_json('/items/2')
+        self.assertNotEqual(second, third)
+
+    def test_should_not_cache_private_responses(self):
+        self.get_json('/session')
+        self.get_json('/items/3', headers={"Authorization": 'Bearer token'})
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_should_not_share_responses_between_cookies(self):
+        _, first = self.get_json('/profile', headers={"Cookie": 'session=first'})
+        _, second = self.get_json('/profile', headers={"Cookie": 'session=second'})
+        self.assertEqual(first, {"cookie": 'session=first'})
+        self.assertEqual(second, {"cookie": 'session=second'})
+        self.get_json('/profile?private=1')
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_should_count_hits_and_misses(self):
+        self.get_json('/items/4')
+        self.get_json('/items/4')
+        stats = self.cache.stats()
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_should_evict_by_entries_and_bytes(self):
+        cache = ResponseCacheMiddleware(max_entries=2, max_bytes=100)
+        for index in range(3):
+            cache.put(('GET', '/%d' % index, (), ()), CacheEntry(200, [], b'x' * 10, 60))
+        self.assertEqual(cache.stats()['entries'], 2)
+        self.assertIsNone(cache.get(('GET', '/0', (), ())))
+        cache.put(('GET', '/big', (), ()), CacheEntry(200, [], b'x' * 90, 60))
+        self.assertEqual(cache.stats()['bytes'], 100)
+        self.assertIsNone(cache.get(('GET', '/1', (), ())))
+
+
+if __name__ == '__main__':
+    unittest.main()
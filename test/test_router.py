@@ -1,4 +1,5 @@
 # Standard libs imports
+import io
 import json
 import unittest
 from unittest import TestCase
@@ -7,10 +8,10 @@ from test.mixins import ServerTestMixin, HttpRequestMixin
 
 # First party libs imports
 from py_sugo.core import GET, PUT
-from py_sugo.router import Route, Router, RouteNotFoundException, RouteAlreadyExistsException
+from py_sugo.router import Route, Router, RouteNotFoundException, MethodNotAllowedException, RouteAlreadyExistsException
 from py_sugo.request import Request
 from py_sugo.response import Response
-from py_sugo.middleware import RequestHandler
+from py_sugo.middleware import NextFunction, RequestHandler
 
 
 class RouterTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
@@ -31,6 +32,8 @@ class RouterTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
         router = Router()
         router.get('/', cls.simple_handler).post('/', cls.simple_handler)
         router.get('/(?P<param>[^\/]+)', cls.param_handler).post('/:id', cls.param_handler)
+        router.get('/users/<int:id>', cls.param_handler).get('/users/me', cls.simple_handler).get('/users/<name>', cls.param_handler)
+        router.get('/files/<path:rest>', cls.param_handler).get('/items/<uuid:id>', cls.param_handler)
         cls.router = router
 
     @classmethod
@@ -63,6 +66,107 @@ class RouterTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
         self.assertEqual(body['method'], GET)
         self.assertEqual(body['params']['param'], 'hello')
 
+    def test_should_convert_typed_params(self):
+        response: HTTPResponse = self.http_request(method=GET, path='/users/12', port=self.port)
+        body = json.loads(response.read())
+        self.assertEqual(body['params']['id'], 12)
+
+    def test_should_prefer_static_segments_over_params(self):
+        self.assertEqual(self.router.find_route(GET, '/users/me').url_pattern, '/users/me')
+        self.assertEqual(self.router.match(GET, '/users/bob').params, {"name": 'bob'})
+        self.assertEqual(self.router.match(GET, '/files/a/b.txt').params, {"rest": 'a/b.txt'})
+        self.assertEqual(str(self.router.match(GET, '/items/12345678-1234-1234-1234-123456789012').params['id']),
+                         '12345678-1234-1234-1234-123456789012')
+        self.assertIsNone(self.router.match(GET, '/items/not-a-uuid'))
+
+    def test_should_not_match_an_empty_path_param(self):
+        self.assertIsNone(self.router.match(GET, '/files/'))
+        self.assertEqual(self.router.allowed_methods('/files/'), set())
+        route = self.router.find_route(GET, '/files/a/')
+        self.assertEqual(route.match('/files/a/'), {"rest": 'a/'})
+        response: HTTPResponse = self.http_request(method=GET, path='/files/a/b', port=self.port)
+        self.assertEqual(json.loads(response.read())['params'], {"rest": 'a/b'})
+
+    def test_should_answer_method_not_allowed_with_an_allow_header(self):
+        self.assertRaises(MethodNotAllowedException, self.router.find_route, PUT, '/users/12')
+        request = Request({"REQUEST_METHOD": PUT, "PATH_INFO": '/users/12', "wsgi.input": io.BytesIO()})
+        response = Response(lambda status, headers: None, request)
+        self.router.handle(request, response)
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response.headers.get('Allow'), GET)
+        self.assertEqual(json.loads(response.body)['status_code'], 405)
+
+    def test_should_forget_cached_misses_when_routes_are_added(self):
+        router = Router(miss_cache_size=1)
+        sub_router = Router()
+        router.mount('/sub', sub_router)
+        self.assertRaises(RouteNotFoundException, router.find_route, GET, '/sub/late')
+        self.assertRaises(RouteNotFoundException, router.find_route, GET, '/other')
+        self.assertEqual(list(router._misses), [(GET, '/other')])
+        sub_router.get('/late', self.simple_handler)
+        self.assertEqual(router.find_route(GET, '/sub/late').url_pattern, '/late')
+
+    def test_should_not_add_the_same_route_twice(self):
+        self.assertRaises(RouteAlreadyExistsException, self.router.get, '/users/me', self.simple_handler)
+
+
+class MountTestCase(TestCase):
+    @staticmethod
+    def dispatch(router: Router, method: str, path: str) -> Request:
+        request = Request({"REQUEST_METHOD": method, "PATH_INFO": path, "wsgi.input": io.BytesIO()})
+        router.handle(request, Response(lambda status, headers: None, request))
+        return request
+
+    def test_should_run_sub_router_middleware_only_for_its_routes(self):
+        def mark(request: Request, response: Response, next_layer: NextFunction):
+            request.body['marked'] = True
+            return next_layer()
+
+        def handler(request: Request, response: Response):
+            return response.json(request.params)
+
+        api = Router().get('/users/<int:id>', handler)
+        router = Router().get('/<name>', handler).mount('/api', api, mark)
+        self.assertEqual(self.dispatch(router, GET, '/api/users/7').params, {"id": 7})
+        self.assertTrue(self.dispatch(router, GET, '/api/users/7').body.get('marked'))
+        self.assertNotIn('marked', self.dispatch(router, GET, '/api').body)
+        self.assertEqual(router.match(GET, '/api/users/7').pattern, '/api/users/<int:id>')
+        self.assertEqual(api.routes[0].url_pattern, '/users/<int:id>')
+        self.assertEqual(len(router.routes), 1)
+
+    def test_should_mount_routers_at_the_root(self):
+        def handler(request: Request, response: Response):
+            return response.json(request.params)
+
+        sub_router = Router().get('/users/<int:id>', handler)
+        router = Router().get('/health', handler).mount('/', sub_router)
+        self.assertEqual(router.match(GET, '/users/3').params, {"id": 3})
+        self.assertEqual(router.match(GET, '/users/3').pattern, '/users/<int:id>')
+        self.assertEqual(router.match(GET, '/health').pattern, '/health')
+        self.assertIsNone(router.match(GET, '/missing'))
+
+    def test_should_find_and_handle_mounted_routes(self):
+        def mark(request: Request, response: Response, next_layer: NextFunction):
+            request.body['marked'] = True
+            return next_layer()
+
+        def handler(request: Request, response: Response):
+            return response.json(request.params)
+
+        router = Router().mount('/api', Router().get('/users/<int:id>', handler), mark)
+        route = router.find_route(GET, '/api/users/7')
+        self.assertEqual(route.url_pattern, '/users/<int:id>')
+        self.assertEqual(route.pattern, '/api/users/<int:id>')
+        request = Request({"REQUEST_METHOD": GET, "PATH_INFO": '/api/users/7', "wsgi.input": io.BytesIO()})
+        route.handle(request, Response(lambda status, headers: None, request))
+        self.assertEqual(request.params, {"id": 7})
+        self.assertTrue(request.body.get('marked'))
+
+    def test_should_raise_when_no_sub_route_matches(self):
+        router = Router().mount('/api', Router().get('/users', lambda request, response: None))
+        self.assertRaises(RouteNotFoundException, router.find_route, GET, '/api/groups')
+        self.assertRaises(ValueError, router.mount, '/<version>', Router())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+# Standard libs imports
+import os
+import shutil
+import unittest
+import tempfile
+from unittest import TestCase
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler, StaticFilesMiddleware, parse_range_header
+from py_sugo.application import Application
+
+SCRIPT_CONTENT: bytes = b'console.log("hello");\n' * 100
+
+
+class StaticFilesMiddlewareTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50023
+    directory: str
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        cls.directory = tempfile.mkdtemp()
+        with open(os.path.join(cls.directory, 'app.js'), 'wb') as file:
+            file.write(SCRIPT_CONTENT)
+        with open(os.path.join(cls.directory, 'index.html'), 'wb') as file:
+            file.write(b'<html></html>')
+
+        def handler(request: Request, response: Response):
+            return response.status(404).json({"path": request.path})
+
+        return handler
+
+    @classmethod
+    def setup_application(cls, application: Application):
+        application.use_middleware(StaticFilesMiddleware(cls.directory, prefix='/static', max_age=60))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(cls.directory)
+
+    def test_should_serve_files_with_validators(self):
+        response = self.http_request('GET', '/static/app.js', port=self.port)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), SCRIPT_CONTENT)
+        self.assertIn('javascript', response.getheader('content-type'))
+        self.assertEqual(response.getheader('cache-control'), 'public, max-age=60')
+        self.assertIsNotNone(response.getheader('etag'))
+        self.assertIsNotNone(response.getheader('last-modified'))
+
+    def test_should_serve_the_index_of_directories(self):
+        response = self.http_request('GET', '/static/', port=self.port)
+        self.assertEqual(response.read(), b'<html></html>')
+
+    def test_should_answer_not_modified(self):
+        response = self.http_request('GET', '/static/app.js', port=self.port)
+        response.read()
+        etag, last_modified = response.getheader('etag'), response.getheader('last-modified')
+        for headers in [{"If-None-Match": etag}, {"If-None-Match": 'W/%s' % etag}, {"If-Modified-Since": last_modified}]:
+            response = self.http_request('GET', '/static/app.js', headers=headers, port=self.port)
+            self.assertEqual(response.status, 304)
+            self.assertEqual(response.read(), b'')
+        response = self.http_request('GET', '/static/app.js', headers={"If-None-Match": '"other"'}, port=self.port)
+        self.assertEqual(response.status, 200)
+
+    def test_should_serve_single_ranges(self):
+        response = self.http_request('GET', '/static/app.js', headers={"Range": 'bytes=10-19'}, port=self.port)
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader('content-range'), 'bytes 10-19/%d' % len(SCRIPT_CONTENT))
+        self.assertEqual(response.read(), SCRIPT_CONTENT[10:20])
+
+    def test_should_serve_multipart_ranges(self):
+        response = self.http_request('GET', '/static/app.js', headers={"Range": 'bytes=0-4, -5'}, port=self.port)
+        body = response.read()
+        self.assertEqual(response.status, 206)
+        self.assertTrue(response.getheader('content-type').startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(response.getheader('content-length')), len(body))
+        self.assertIn(b'Content-Range: bytes 0-4/%d\r\n\r\n%s\r\n' % (len(SCRIPT_CONTENT), SCRIPT_CONTENT[:5]), body)
+        self.assertIn(SCRIPT_CONTENT[-5:], body)
+
+    def test_should_reject_unsatisfiable_ranges(self):
+        response = self.http_request('GET', '/static/app.js', headers={"Range": 'bytes=99999-'}, port=self.port)
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader('content-range'), 'bytes */%d' % len(SCRIPT_CONTENT))
+
+    def test_should_pass_missing_files_and_escapes_to_the_next_layer(self):
+        for path in ['/static/missing.js', '/static/../etc/passwd', '/other/app.js']:
+            response = self.http_request('GET', path, port=self.port)
+            self.assertEqual(response.status, 404)
+
+    def test_should_find_files_created_after_a_miss(self):
+        middleware = StaticFilesMiddleware(self.directory, check_interval=0)
+        self.assertIsNone(middleware.find_file('/late.js'))
+        with open(os.path.join(self.directory, 'late.js'), 'wb') as file:
+            file.write(b'late')
+        self.assertEqual(middleware.find_file('/late.js').size, 4)
+
+    def test_should_parse_range_headers(self):
+        self.assertEqual(parse_range_header('bytes=0-9,20-', 30), [(0, 9), (20, 29)])
+        self.assertEqual(parse_range_header('bytes=-5', 30), [(25, 29)])
+        self.assertEqual(parse_range_header('bytes=40-50', 30), [])
+        self.assertIsNone(parse_range_header('items=0-1', 30))
+        self.assertIsNone(parse_range_header('bytes=5-1', 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# Standard libs imports
+import os
+import unittest
+import tempfile
+from unittest import TestCase
+from http.client import HTTPConnection
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler
+from py_sugo.application import Application
+
+FILE_CONTENT: bytes = bytes(range(256)) * 1024
+
+
+class StreamingResponseTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50021
+    keep_alive_port: int = 50022
+    file_path: str
+    keep_alive_application: Application
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.keep_alive_application = Application(cls.get_request_handler())
+        cls.keep_alive_application.listen(port=cls.keep_alive_port, parallel=True, workers=2, keep_alive=True)
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        file_descriptor, cls.file_path = tempfile.mkstemp(suffix='.bin')
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(FILE_CONTENT)
+
+        def stream(request: Request, response: Response):
+            response.stream(b'chunk-%d;' % index for index in range(5))
+
+        def whole_file(request: Request, response: Response):
+            response.send_file(cls.file_path)
+
+        def file_range(request: Request, response: Response):
+            response.send_file(cls.file_path, offset=1000, length=5000, content_type='text/plain')
+
+        router = Router()
+        router.get('/stream', stream)
+        router.get('/file', whole_file)
+        router.get('/range', file_range)
+        return router.handle
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        cls.keep_alive_application.close()
+        os.remove(cls.file_path)
+
+    def test_should_stream_generator_bodies(self):
+        response = self.http_request('GET', '/stream', port=self.port)
+        self.assertEqual(response.read(), b'chunk-0;chunk-1;chunk-2;chunk-3;chunk-4;')
+
+    def test_should_use_chunked_encoding_when_the_length_is_unknown(self):
+        connection = HTTPConnection('localhost', self.keep_alive_port)
+        try:
+            for _ in range(2):
+                connection.request('GET', '/stream')
+                response = connection.getresponse()
+                self.assertEqual(response.getheader('transfer-encoding'), 'chunked')
+                self.assertEqual(response.read(), b'chunk-0;chunk-1;chunk-2;chunk-3;chunk-4;')
+        finally:
+            connection.close()
+
+    def test_should_send_files(self):
+        for port in [self.port, self.keep_alive_port]:
+            response = self.http_request('GET', '/file', port=port)
+            self.assertEqual(response.getheader('content-length'), str(len(FILE_CONTENT)))
+            self.assertEqual(response.getheader('content-type'), 'application/octet-stream')
+            self.assertEqual(response.read(), FILE_CONTENT)
+
+    def test_should_send_file_ranges(self):
+        for port in [self.port, self.keep_alive_port]:
+            response = self.http_request('GET', '/range', port=port)
+            self.assertEqual(response.getheader('content-type'), 'text/plain')
+            self.assertEqual(response.read(), FILE_CONTENT[1000:6000])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Standard libs imports
+import json
+import time
+import unittest
+from typing import List
+from unittest import TestCase
+from threading import Event, Thread
+from test.mixins import ServerTestMixin, HttpRequestMixin
+
+# First party libs imports
+from py_sugo.router import Router
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.middleware import RequestHandler
+from py_sugo.watchdog import SlowRequestReport, Watchdog
+from py_sugo.application import Application
+
+
+class WatchdogTestCase(ServerTestMixin, HttpRequestMixin, TestCase):
+    port: int = 50032
+    release: Event
+    reports: List[SlowRequestReport]
+    watchdog: Watchdog
+    listen_kwargs = {"workers": 2}
+
+    @classmethod
+    def get_request_handler(cls) -> RequestHandler:
+        cls.release = Event()
+        cls.reports = list()
+
+        def hang_in_handler(request: Request, response: Response):
+            cls.release.wait(5)
+            return response.json({"released": True})
+
+        router = Router()
+        router.get('/hang', hang_in_handler)
+        cls.watchdog = Watchdog(threshold=0.2, interval=0.05, sink=cls.reports.append)
+        router.mount('/debug', cls.watchdog.router())
+        return router.handle
+
+    @classmethod
+    def setup_application(cls, application: Application):
+        application.use_watchdog(cls.watchdog)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.release.set()
+        super().tearDownClass()
+
+    def test_should_report_the_stack_of_slow_requests(self):
+        hanging = Thread(target=lambda: self.http_request('GET', '/hang', headers={"X-Request-ID": 'slow-1'}, port=self.port).read())
+        hanging.start()
+        deadline = time.monotonic() + 3
+        while not self.reports and time.monotonic() < deadline:
+            time.sleep(0.05)
+        response = self.http_request('GET', '/debug/in-flight', port=self.port)
+        in_flight = json.loads(response.read())['in_flight']
+        self.release.set()
+        hanging.join()
+        self.assertEqual(len(self.reports), 1)
+        report = self.reports[0]
+        self.assertEqual((report.request_id, report.method, report.path, report.route), ('slow-1', 'GET', '/hang', '/hang'))
+        self.assertGreaterEqual(report.age, 0.2)
+        self.assertIn('hang_in_handler', report.stack)
+        self.assertEqual([entry['id'] for entry in in_flight][0], 'slow-1')
+        self.assertEqual(len(in_flight), 2)
+        self.assertEqual(self.watchdog.in_flight(), [])
+
+    def test_should_run_in_prefork_children(self):
+        watchdog = Watchdog(threshold=0.1, interval=0.05, sink=lambda report: None)
+
+        def watchdog_state(request: Request, response: Response):
+            return response.json({"running": watchdog._thread is not None and watchdog._thread.is_alive()})
+
+        port = 50038
+        application = Application(watchdog_state)
+        application.use_watchdog(watchdog)
+        application.listen(port=port, parallel=True, processes=1)
+        try:
+            deadline = time.monotonic() + 5
+            body = None
+            while body is None and time.monotonic() < deadline:
+                try:
+                    body = json.loads(self.http_request('GET', '/', port=port).read())
+                except ConnectionError:
+                    time.sleep(0.05)
+        finally:
+            application.close()
+        self.assertEqual(body, {"running": True})
+        self.assertIsNone(watchdog._thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
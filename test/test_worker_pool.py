@@ -0,0 +1,52 @@
+# Standard libs imports
+import json
+import unittest
+from unittest import TestCase
+from threading import Event, Thread
+from test.mixins import HttpRequestMixin
+
+# First party libs imports
+from py_sugo.request import Request
+from py_sugo.response import Response
+from py_sugo.application import Application
+
+
+class WorkerPoolTestCase(HttpRequestMixin, TestCase):
+    port: int = 50011
+
+    def test_slow_handler_should_not_block_other_clients(self):
+        started = Event()
+        release = Event()
+
+        def handler(request: Request, response: Response):
+            if request.path == '/slow':
+                started.set()
+                release.wait(5)
+            return response.json({"path": request.path})
+
+        application = Application(handler)
+        application.listen(port=self.port, parallel=True, workers=2, backlog=4)
+        slow_request = Thread(target=self.http_request, args=('GET', '/slow'), kwargs={"port": self.port})
+        slow_request.start()
+        started.wait(5)
+        try:
+            response = self.http_request('GET', '/fast', port=self.port)
+            body = json.loads(response.read())
+            self.assertEqual(body['path'], '/fast')
+            self.assertGreaterEqual(application.stats()['busy_workers'], 1)
+            self.assertEqual(application.stats()['queue_depth'], 0)
+        finally:
+            release.set()
+            slow_request.join()
+            application.close()
+
+    def test_stats_should_be_empty_without_workers(self):
+        application = Application(lambda request, response: response.json({}))
+        application.listen(port=self.port + 1, parallel=True)
+        stats = application.stats()
+        application.close()
+        self.assertEqual(stats['workers'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()